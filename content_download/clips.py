@@ -1,10 +1,56 @@
 import imageio_ffmpeg
 import os
+import signal
 import subprocess
-import glob
-import requests
+import hashlib
+import json
+import aiohttp
 import asyncio
-from typing import List
+from typing import Dict, List, Optional
+from trend_discovery.session import get_session
+
+# Retry policy for Sakugabooru media downloads
+DOWNLOAD_RETRIES = 3
+RETRY_BACKOFF = 0.3
+
+# Seconds before the YouTube HQ yt-dlp run is stopped (clips saved so far are kept)
+YOUTUBE_HQ_TIMEOUT = 300
+
+# Downloaded file per URL hash for each output dir, mirrored to <output_dir>/.cache.json
+_URL_CACHE: Dict[str, Dict[str, str]] = {}
+
+def _url_key(url: str) -> str:
+    """Short content-addressable key for a download URL."""
+    return hashlib.sha1(url.encode()).hexdigest()[:16]
+
+def _url_cache(output_dir: str) -> Dict[str, str]:
+    """Returns the download index for `output_dir`, loading it from disk once per run."""
+    index = _URL_CACHE.get(output_dir)
+    if index is None:
+        index = _URL_CACHE[output_dir] = {}
+        try:
+            with open(os.path.join(output_dir, ".cache.json")) as f:
+                index.update(json.load(f))
+        except (OSError, ValueError):
+            pass
+    return index
+
+def _cached_download(url: str, output_dir: str) -> Optional[str]:
+    """Returns the file previously downloaded from `url` into `output_dir`, if it still exists."""
+    path = _url_cache(output_dir).get(_url_key(url))
+    return path if path and os.path.exists(path) else None
+
+def _remember_download(url: str, path: str, output_dir: str):
+    """Records a finished download and persists that dir's index."""
+    index = _url_cache(output_dir)
+    index[_url_key(url)] = path
+    index_path = os.path.join(output_dir, ".cache.json")
+    try:
+        with open(index_path + ".tmp", 'w') as f:
+            json.dump(index, f)
+        os.replace(index_path + ".tmp", index_path)
+    except OSError as e:
+        print(f"    Could not save clip cache index: {e}")
 
 async def get_high_quality_clips(
     anime_title: str,
@@ -34,13 +80,66 @@ async def get_high_quality_clips(
             all_clips.extend(clips)
             
         elif source == 'youtube_shorts':
-            # Fallback to standard search
-            clips = get_anime_clips(f"{anime_title} edit clips", remaining, output_dir)
+            # Fallback to standard search (blocking yt-dlp run, so off the event loop)
+            clips = await asyncio.to_thread(get_anime_clips, f"{anime_title} edit clips", remaining, output_dir)
             all_clips.extend(clips)
             
     return all_clips[:count]
 
 
+def _remove_partial(part_path: str):
+    """Deletes an abandoned .part file, if one was started."""
+    try:
+        os.remove(part_path)
+    except OSError:
+        pass
+
+
+async def _download_sakuga_post(session: aiohttp.ClientSession, post: dict, output_dir: str) -> Optional[str]:
+    """
+    Downloads one Sakugabooru post's mp4, streaming it to disk in chunks.
+    Returns the local path, or None if the download failed.
+    """
+    filename = f"sakuga_{post.get('id')}.mp4"
+    filepath = os.path.join(output_dir, filename)
+    
+    cached = _cached_download(post['file_url'], output_dir)
+    if cached:
+        return cached
+    if os.path.exists(filepath):
+        _remember_download(post['file_url'], filepath, output_dir)
+        return filepath
+    
+    timeout = aiohttp.ClientTimeout(total=None, sock_connect=20, sock_read=20)
+    # Write to a .part file so an interrupted download is never mistaken for a clip
+    part_path = filepath + ".part"
+    
+    for attempt in range(DOWNLOAD_RETRIES + 1):
+        try:
+            async with session.get(post['file_url'], timeout=timeout) as r:
+                if r.status >= 500 and attempt < DOWNLOAD_RETRIES:
+                    raise aiohttp.ClientResponseError(r.request_info, r.history, status=r.status)
+                if r.status != 200:
+                    return None
+                with open(part_path, 'wb') as f:
+                    async for chunk in r.content.iter_chunked(1 << 18):
+                        f.write(chunk)
+            os.replace(part_path, filepath)
+            _remember_download(post['file_url'], filepath, output_dir)
+            return filepath
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if attempt < DOWNLOAD_RETRIES:
+                await asyncio.sleep(RETRY_BACKOFF * 2 ** attempt)
+                continue
+            print(f"    Failed to download sakuga clip: {e}")
+            _remove_partial(part_path)
+            return None
+        except Exception as e:
+            print(f"    Failed to download sakuga clip: {e}")
+            _remove_partial(part_path)
+            return None
+
+
 async def get_clips_from_sakugabooru(anime_title: str, count: int, output_dir: str) -> List[str]:
     """
     Search Sakugabooru API for high-quality animation cuts.
@@ -57,39 +156,21 @@ async def get_clips_from_sakugabooru(anime_title: str, count: int, output_dir: s
             "limit": count * 2  # Fetch more to filter
         }
         
-        response = requests.get(url, params=params, timeout=10)
-        if response.status_code != 200:
-            return []
-            
-        posts = response.json()
+        session = await get_session()
+        async with session.get(url, params=params, timeout=aiohttp.ClientTimeout(total=10)) as response:
+            if response.status != 200:
+                return []
+            posts = await response.json(content_type=None)
+        
+        candidates = [post for post in posts if (post.get('file_url') or '').endswith('.mp4')]
         downloaded_clips = []
         
-        for post in posts:
-            if len(downloaded_clips) >= count:
-                break
-                
-            file_url = post.get('file_url')
-            if not file_url or not file_url.endswith('.mp4'):
-                continue
-                
-            # Download file
-            filename = f"sakuga_{post.get('id')}.mp4"
-            filepath = os.path.join(output_dir, filename)
-            
-            if not os.path.exists(filepath):
-                try:
-                    # Download using requests
-                    r = requests.get(file_url, stream=True, timeout=20)
-                    if r.status_code == 200:
-                        with open(filepath, 'wb') as f:
-                            for chunk in r.iter_content(chunk_size=8192):
-                                f.write(chunk)
-                        downloaded_clips.append(filepath)
-                except Exception as e:
-                    print(f"    Failed to download sakuga clip: {e}")
-                    continue
-            else:
-                downloaded_clips.append(filepath)
+        # Download concurrently, topping up from the remaining posts if any fail
+        while candidates and len(downloaded_clips) < count:
+            needed = count - len(downloaded_clips)
+            batch, candidates = candidates[:needed], candidates[needed:]
+            results = await asyncio.gather(*(_download_sakuga_post(session, post, output_dir) for post in batch))
+            downloaded_clips.extend(path for path in results if path)
                 
         return downloaded_clips
         
@@ -108,40 +189,58 @@ async def get_clips_from_youtube_hq(anime_title: str, count: int, output_dir: st
         f"{anime_title} raw scenes"
     ]
     
+    # One yt-dlp run for every query: it downloads each video ID once even
+    # when searches overlap, and stops as soon as `count` clips are saved
+    output_template = os.path.join(output_dir, "hq_%(id)s.%(ext)s")
+    cmd = [
+        "yt-dlp",
+        "--ffmpeg-location", imageio_ffmpeg.get_ffmpeg_exe(),
+        "-f", "bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best",
+        "--max-filesize", "50M",
+        "--match-filter", "duration > 5 & duration < 45",  # Short clips only
+        "--max-downloads", str(count),
+        "--concurrent-fragments", "4",  # Fetch DASH fragments in parallel
+        "--download-archive", os.path.join(output_dir, ".yt_archive"),  # Skip video IDs already fetched
+        "-o", output_template,
+        "--print", "after_move:filepath",  # Report each finished clip on stdout
+        *(f"ytsearch{count}:{query}" for query in queries)
+    ]
+    
     downloaded_clips = []
-    ffmpeg_exe = imageio_ffmpeg.get_ffmpeg_exe()
+    proc = None
     
-    for query in queries:
-        if len(downloaded_clips) >= count:
-            break
-            
-        search_query = f"ytsearch{count}:{query}"
-        output_template = os.path.join(output_dir, "hq_%(id)s.%(ext)s")
-        
-        cmd = [
-            "yt-dlp",
-            "--ffmpeg-location", ffmpeg_exe,
-            "-f", "bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best",
-            "--max-filesize", "50M",
-            "--match-filter", "duration > 5 & duration < 45",  # Short clips only
-            "-o", output_template,
-            search_query
-        ]
-        
-        try:
-            subprocess.run(cmd, check=True, capture_output=True)
-            
-            # Find new files
-            files = glob.glob(os.path.join(output_dir, "hq_*.mp4"))
-            # Filter valid ones
-            for f in files:
-                if f not in downloaded_clips:
-                    downloaded_clips.append(f)
-                    
-        except Exception as e:
-            print(f"    YouTube HQ error: {e}")
-            continue
-            
+    async def _collect_paths() -> int:
+        async for line in proc.stdout:
+            path = line.decode(errors='replace').strip()
+            if path.endswith('.mp4') and os.path.exists(path):
+                downloaded_clips.append(path)
+        return await proc.wait()
+    
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+            start_new_session=True
+        )
+        returncode = await asyncio.wait_for(_collect_paths(), YOUTUBE_HQ_TIMEOUT)
+        # 101 means --max-downloads was reached, i.e. enough clips
+        if returncode not in (0, 101):
+            print(f"    YouTube HQ error: yt-dlp exited with {returncode}")
+    except asyncio.TimeoutError:
+        print(f"    YouTube HQ timed out after {YOUTUBE_HQ_TIMEOUT}s")
+    except Exception as e:
+        print(f"    YouTube HQ error: {e}")
+    finally:
+        if proc is not None and proc.returncode is None:
+            # yt-dlp's ffmpeg children share its stdout, so stop the whole group
+            try:
+                os.killpg(proc.pid, signal.SIGKILL)
+            except (AttributeError, ProcessLookupError):
+                proc.kill()
+            await proc.wait()
+    
+    # Only this run's downloads, never other files in the folder
     return downloaded_clips
 
 
@@ -160,15 +259,22 @@ def get_anime_clips(query: str, count: int = 3, output_dir: str = "output/clips"
         "--ffmpeg-location", ffmpeg_exe,
         "-f", "bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best",
         "--max-filesize", "50M",
+        "--download-archive", os.path.join(output_dir, ".yt_archive"),
         "-o", output_template,
         search_query
     ]
     
     try:
         subprocess.run(cmd, check=True, capture_output=True)
-        files = glob.glob(os.path.join(output_dir, "*"))
-        valid_extensions = {'.mp4', '.mkv', '.webm', '.mov'}
-        video_files = [f for f in files if os.path.splitext(f)[1].lower() in valid_extensions and not f.endswith('.part') and 'sakuga_' not in f and 'hq_' not in f]
+        # scandir gives the file type from the directory entry, no per-file stat
+        valid_extensions = ('.mp4', '.mkv', '.webm', '.mov')
+        with os.scandir(output_dir) as entries:
+            video_files = [
+                e.path for e in entries
+                if e.is_file(follow_symlinks=False)
+                and e.name.lower().endswith(valid_extensions)
+                and not e.name.startswith(('sakuga_', 'hq_'))
+            ]
         return video_files[:count]
     except subprocess.CalledProcessError as e:
         print(f"Error gathering clips: {e}")
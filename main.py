@@ -5,6 +5,7 @@ import asyncio
 from trend_discovery.discovery import get_trending_anime_edits_v2
 from content_download.audio import download_audio
 from content_download.clips import get_anime_clips
+from trend_discovery.session import close_session
 from video_making.orchestrator import create_editing_plan, generate_search_queries
 from video_making.executor import execute_editing_plan
 import imageio_ffmpeg
@@ -18,7 +19,11 @@ async def run_agent():
     # Step 1: Find trending edits (Data-Driven)
     print("[Step 1] Finding trending anime edits (Data-Driven)...")
     # Use temperature=0.5 for balanced creativity (1-2 anime)
-    trending_result = await get_trending_anime_edits_v2(temperature=0.5)
+    try:
+        trending_result = await get_trending_anime_edits_v2(temperature=0.5)
+    finally:
+        # Clip downloads are done (or failed); release the pooled HTTP connections
+        await close_session()
     
     if not trending_result:
         print("❌ All trending sources failed. Exiting.")
@@ -27,6 +32,7 @@ async def run_agent():
     selected_animes = trending_result['selected_animes']
     song_data = trending_result['song']
     audio_path = trending_result['audio_path']
+    beat_data = trending_result.get('beat_data')
     clip_paths = trending_result['clip_paths']
     metadata = trending_result['metadata']
     
@@ -43,7 +49,8 @@ async def run_agent():
         audio_path=audio_path,
         tiktok_metadata=song_data, # Use song metadata as base
         clip_paths=clip_paths,
-        temperature=0.5
+        temperature=0.5,
+        beat_data=beat_data  # Analyzed while clips were downloading
     )
     
     # Step 3: EXECUTOR AGENT - Build video
@@ -1,8 +1,28 @@
-import requests
-from typing import List, Dict
+import hashlib
+import json
+from typing import List, Dict, Optional
 from datetime import datetime
+from trend_discovery.cache import cached_json, TRENDING_TTL
+from trend_discovery.session import RateLimiter, fetch_json
 from trend_discovery.utils import _match_anime_to_song
 
+ANILIST_URL = 'https://graphql.anilist.co'
+
+# AniList allows 90 requests/minute; stay under it
+ANILIST_LIMITER = RateLimiter(80, 60)
+
+async def _post_graphql(query: str, variables: Dict) -> Optional[Dict]:
+    """
+    Runs one rate-limited AniList GraphQL query; None on a failed reply.
+    Replies are cached for TRENDING_TTL per (query, variables).
+    """
+    async def fetch():
+        return await fetch_json('POST', ANILIST_URL, ANILIST_LIMITER, json={'query': query, 'variables': variables})
+    
+    body = json.dumps({'query': query, 'variables': variables}, sort_keys=True)
+    key = f"anilist:{hashlib.sha1(body.encode()).hexdigest()}"
+    return await cached_json(key, TRENDING_TTL, fetch)
+
 async def get_anilist_trending_split(airing_count=5, finished_count=5) -> List[Dict]:
     """
     Get trending anime split between airing and finished.
@@ -28,10 +48,11 @@ async def get_anilist_trending_split(airing_count=5, finished_count=5) -> List[D
         else:
             season = "FALL"
         
-        # Query 1: Airing anime (current season)
-        airing_query = '''
-        query ($page: Int, $perPage: Int, $season: MediaSeason, $year: Int) {
-            Page(page: $page, perPage: $perPage) {
+        # Airing (current season) and recently finished anime in one request,
+        # as two aliased Page roots
+        query = '''
+        query ($season: MediaSeason, $year: Int, $airingPerPage: Int, $finishedPerPage: Int) {
+            airing: Page(page: 1, perPage: $airingPerPage) {
                 media(type: ANIME, sort: TRENDING_DESC, status: RELEASING, season: $season, seasonYear: $year) {
                     id
                     title { romaji english }
@@ -40,27 +61,7 @@ async def get_anilist_trending_split(airing_count=5, finished_count=5) -> List[D
                     averageScore
                 }
             }
-        }
-        '''
-        
-        airing_response = requests.post(
-            'https://graphql.anilist.co',
-            json={
-                'query': airing_query,
-                'variables': {
-                    'page': 1,
-                    'perPage': airing_count,
-                    'season': season,
-                    'year': current_year
-                }
-            },
-            timeout=15
-        )
-        
-        # Query 2: Recently finished anime
-        finished_query = '''
-        query ($page: Int, $perPage: Int) {
-            Page(page: $page, perPage: $perPage) {
+            finished: Page(page: 1, perPage: $finishedPerPage) {
                 media(type: ANIME, sort: TRENDING_DESC, status: FINISHED) {
                     id
                     title { romaji english }
@@ -72,46 +73,26 @@ async def get_anilist_trending_split(airing_count=5, finished_count=5) -> List[D
         }
         '''
         
-        finished_response = requests.post(
-            'https://graphql.anilist.co',
-            json={
-                'query': finished_query,
-                'variables': {
-                    'page': 1,
-                    'perPage': finished_count
-                }
-            },
-            timeout=15
-        )
+        data = await _post_graphql(query, {
+            'season': season,
+            'year': current_year,
+            'airingPerPage': airing_count,
+            'finishedPerPage': finished_count
+        })
+        pages = (data or {}).get('data') or {}
         
         # Merge results
         anime_list = []
         
-        if airing_response.status_code == 200:
-            airing_data = airing_response.json()
-            airing_anime = airing_data.get('data', {}).get('Page', {}).get('media', [])
-            for anime in airing_anime:
+        for status in ('airing', 'finished'):
+            for anime in (pages.get(status) or {}).get('media', []):
                 title = anime.get('title', {}).get('english') or anime.get('title', {}).get('romaji', 'Unknown')
                 anime_list.append({
                     'id': anime.get('id'),
                     'title': title,
                     'genres': anime.get('genres', []),
                     'popularity': anime.get('popularity', 0),
-                    'status': 'airing',
-                    'source': 'anilist'
-                })
-        
-        if finished_response.status_code == 200:
-            finished_data = finished_response.json()
-            finished_anime = finished_data.get('data', {}).get('Page', {}).get('media', [])
-            for anime in finished_anime:
-                title = anime.get('title', {}).get('english') or anime.get('title', {}).get('romaji', 'Unknown')
-                anime_list.append({
-                    'id': anime.get('id'),
-                    'title': title,
-                    'genres': anime.get('genres', []),
-                    'popularity': anime.get('popularity', 0),
-                    'status': 'finished',
+                    'status': status,
                     'source': 'anilist'
                 })
         
@@ -151,16 +132,10 @@ async def _try_anilist_trending(count: int) -> List[Dict]:
             'perPage': count
         }
         
-        response = requests.post(
-            'https://graphql.anilist.co',
-            json={'query': query, 'variables': variables},
-            timeout=15
-        )
-        
-        if response.status_code != 200:
+        data = await _post_graphql(query, variables)
+        if not data:
             return []
         
-        data = response.json()
         anime_list = data.get('data', {}).get('Page', {}).get('media', [])
         
         # Generate videos with genre-matched songs
@@ -0,0 +1,97 @@
+"""
+TTL cache for trending lookups. Trending lists change over hours, so repeat
+discovery runs can reuse recent API replies instead of refetching them.
+
+Entries live in memory for the current process and as JSON files on disk
+so they survive between runs.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+CACHE_DIR = os.path.expanduser("~/.cache/anime_edit/trending")
+
+# How long trending replies stay fresh
+TRENDING_TTL = 3600
+
+# Set this environment variable to ignore cached replies (fresh ones are still saved)
+NO_CACHE_ENV = "ANIME_EDIT_NO_CACHE"
+
+_MEMORY: Dict[str, Tuple[float, Any]] = {}
+
+# Fetches in progress, shared by concurrent callers asking for the same key
+_INFLIGHT: Dict[str, asyncio.Task] = {}
+_WAITERS: Dict[str, int] = {}
+
+def _cache_path(key: str) -> str:
+    return os.path.join(CACHE_DIR, hashlib.sha1(key.encode()).hexdigest() + ".json")
+
+def _read_disk(key: str):
+    try:
+        with open(_cache_path(key)) as f:
+            entry = json.load(f)
+        return entry['time'], entry['value']
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+def _write_disk(key: str, stored_at: float, value: Any):
+    path = _cache_path(key)
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(path + ".tmp", 'w') as f:
+            json.dump({'time': stored_at, 'value': value}, f)
+        os.replace(path + ".tmp", path)
+    except (OSError, TypeError, ValueError) as e:
+        print(f"    Could not save trending cache: {e}")
+
+async def cached_json(key: str, ttl: float, fetch: Callable[[], Awaitable[Any]]) -> Any:
+    """
+    Returns the cached value for `key` if younger than `ttl` seconds,
+    otherwise awaits fetch() and caches its (JSON-serializable) result.
+    
+    Empty results (None, [], {}) are not cached, since fetchers return
+    those on failure. Setting ANIME_EDIT_NO_CACHE forces a fresh fetch.
+    Concurrent calls for the same key share one fetch, which is cancelled
+    once every caller waiting on it has been cancelled.
+    
+    Args:
+        key: Cache key, e.g. "anilist:<query hash>"
+        ttl: Freshness window in seconds
+        fetch: Zero-argument coroutine function producing the value
+    
+    Returns:
+        Cached or freshly fetched value
+    """
+    now = time.time()
+    entry = None if os.getenv(NO_CACHE_ENV) else (_MEMORY.get(key) or _read_disk(key))
+    if entry and now - entry[0] < ttl:
+        _MEMORY[key] = entry
+        return entry[1]
+    
+    task = _INFLIGHT.get(key)
+    if task is None:
+        async def _fetch_and_store():
+            try:
+                value = await fetch()
+                if value:
+                    stored_at = time.time()
+                    _MEMORY[key] = (stored_at, value)
+                    _write_disk(key, stored_at, value)
+                return value
+            finally:
+                _INFLIGHT.pop(key, None)
+        
+        task = _INFLIGHT[key] = asyncio.create_task(_fetch_and_store())
+    
+    _WAITERS[key] = _WAITERS.get(key, 0) + 1
+    try:
+        # Shielded so one cancelled caller doesn't abort the fetch for the others
+        return await asyncio.shield(task)
+    finally:
+        _WAITERS[key] -= 1
+        if not _WAITERS[key]:
+            del _WAITERS[key]
+            task.cancel()
@@ -15,6 +15,7 @@ from typing import List, Dict, Optional
 
 from content_download.clips import get_high_quality_clips
 from content_download.audio import download_audio
+from video_making.beat_detector import detect_beats
 
 from trend_discovery.anilist import get_anilist_trending_split, _try_anilist_trending
 from trend_discovery.kitsu import _try_kitsu_trending
@@ -26,17 +27,38 @@ from trend_discovery.utils import _get_popular_phonk_songs, _get_hardcoded_track
 # DATA-DRIVEN TRENDING DISCOVERY SYSTEM
 # ============================================================================
 
+# Concurrent YouTube Shorts searches (each one is a yt-dlp process)
+SHORTS_SEARCH_CONCURRENCY = 4
+
+# Shorts that are plenty to score from; remaining searches are cancelled
+ENOUGH_SHORTS = 15
+
+# Animes whose clips are gathered at the same time
+CLIP_GATHER_CONCURRENCY = 3
+
+# Each anime's clips go to their own subfolder, so concurrent downloads
+# never see each other's unfinished yt-dlp files
+CLIPS_DIR = "output/clips"
+
+def _anime_clip_dir(anime_title: str) -> str:
+    """Clip folder for one anime, e.g. output/clips/jujutsu_kaisen."""
+    name = "".join(c for c in anime_title.lower().replace(' ', '_') if c.isalnum() or c == '_')
+    return os.path.join(CLIPS_DIR, name or "unknown")
+
 async def get_trending_anime_edits_v2(count=3, temperature=0.5) -> Dict:
     """
     Data-driven workflow: 
     AniList anime → YouTube Shorts → Scoring → Selection → Audio Download → Clip Gathering
     
+    Audio download + beat analysis run alongside clip gathering, since
+    neither depends on the other.
+    
     Args:
         count: Number of final edits to return (not used in new system)
         temperature: 0-1, controls diversity (affects anime selection count)
     
     Returns:
-        Dict with selected_animes, song, audio_path, clip_paths, metadata
+        Dict with selected_animes, song, audio_path, beat_data, clip_paths, metadata
     """
     print(f"🔍 Data-Driven Discovery (temp={temperature:.2f})...")
     
@@ -56,13 +78,39 @@ async def get_trending_anime_edits_v2(count=3, temperature=0.5) -> Dict:
     
     # Step 2: Search YouTube Shorts for each anime (3 shorts each = 30 total)
     print("\n[Step 2] Searching YouTube Shorts for each anime...")
-    all_shorts = []
-    for anime in anime_list:
+    search_slots = asyncio.Semaphore(SHORTS_SEARCH_CONCURRENCY)
+    
+    async def _search(anime):
         anime_title = anime.get('title', anime.get('caption', 'Unknown'))
-        print(f"  → Searching shorts for: {anime_title}")
-        shorts = await search_shorts_for_anime(anime_title, count=3)
-        print(f"    Found {len(shorts)} shorts")
-        all_shorts.extend(shorts)
+        async with search_slots:
+            print(f"  → Searching shorts for: {anime_title}")
+            shorts = await search_shorts_for_anime(anime_title, count=3)
+        print(f"    Found {len(shorts)} shorts for {anime_title}")
+        return shorts
+    
+    # Searches are independent, so run a few at a time and stop once there
+    # are enough shorts to score (results keep anime order)
+    search_tasks = [asyncio.create_task(_search(anime)) for anime in anime_list]
+    found = 0
+    try:
+        for next_done in asyncio.as_completed(search_tasks):
+            try:
+                found += len(await next_done)
+            except Exception as e:
+                print(f"    Shorts search failed: {e}")
+                continue
+            if found >= ENOUGH_SHORTS:
+                break
+    finally:
+        for task in search_tasks:
+            task.cancel()
+        await asyncio.gather(*search_tasks, return_exceptions=True)
+    # Searches that failed, or finished after the early stop, are skipped
+    all_shorts = [
+        short for task in search_tasks
+        if not task.cancelled() and task.exception() is None
+        for short in task.result()
+    ]
     
     print(f"  ✓ Total shorts found: {len(all_shorts)}")
     
@@ -81,38 +129,51 @@ async def get_trending_anime_edits_v2(count=3, temperature=0.5) -> Dict:
     print(f"  ✓ Selected {len(selected['animes'])} anime(s) + 1 song")
     print(f"    Song: {selected['song']['sound_title']} by {selected['song']['sound_author']}")
     
-    # Step 4: Download full song
+    # Step 4: Download full song and analyze its beats (in worker threads)
     print("\n[Step 4] Downloading audio...")
     song_data = selected['song']
     audio_filename = f"{song_data['sound_id']}.mp3"
     audio_path = os.path.join("output/audio", audio_filename)
     
-    # Use video_url as source for audio
-    downloaded_audio = download_audio(song_data['video_url'], audio_path)
-    if not downloaded_audio:
-        print("  ✗ Audio download failed")
-        return None
-    print(f"  ✓ Audio downloaded: {downloaded_audio}")
+    async def _prepare_audio():
+        # Use video_url as source for audio
+        downloaded = await asyncio.to_thread(download_audio, song_data['video_url'], audio_path)
+        if not downloaded:
+            return None, None
+        print(f"  ✓ Audio downloaded: {downloaded}")
+        return downloaded, await asyncio.to_thread(detect_beats, downloaded)
+    
+    audio_task = asyncio.create_task(_prepare_audio())
     
-    # Step 5: Download high-quality clips
+    # Step 5: Download high-quality clips while the audio is processed
     print("\n[Step 5] Gathering high-quality clips...")
-    clip_paths = []
-    for anime_title in selected['animes']:
-        print(f"  → Getting clips for: {anime_title}")
-        clips = await get_high_quality_clips(
-            anime_title,
-            count=5,
-            sources=['sakugabooru', 'youtube_hq', 'youtube_shorts'],
-            output_dir="output/clips"
-        )
-        clip_paths.extend(clips)
-        
+    clip_slots = asyncio.Semaphore(CLIP_GATHER_CONCURRENCY)
+    
+    async def _gather_clips(anime_title):
+        async with clip_slots:
+            print(f"  → Getting clips for: {anime_title}")
+            return await get_high_quality_clips(
+                anime_title,
+                count=5,
+                sources=['sakugabooru', 'youtube_hq', 'youtube_shorts'],
+                output_dir=_anime_clip_dir(anime_title)
+            )
+    
+    clip_groups = await asyncio.gather(*(_gather_clips(title) for title in selected['animes']))
+    clip_paths = [clip for clips in clip_groups for clip in clips]
+    
     print(f"  ✓ Collected {len(clip_paths)} clips total")
     
+    downloaded_audio, beat_data = await audio_task
+    if not downloaded_audio:
+        print("  ✗ Audio download failed")
+        return None
+    
     return {
         'selected_animes': selected['animes'],
         'song': selected['song'],
         'audio_path': downloaded_audio,
+        'beat_data': beat_data,
         'clip_paths': clip_paths,
         'metadata': selected
     }
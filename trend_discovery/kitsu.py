@@ -1,7 +1,11 @@
-import requests
 from typing import List, Dict
+from trend_discovery.cache import cached_json, TRENDING_TTL
+from trend_discovery.session import RateLimiter, fetch_json
 from trend_discovery.utils import _match_anime_to_song
 
+# Kitsu has no published limit; keep bursts modest
+KITSU_LIMITER = RateLimiter(60, 60)
+
 async def _try_kitsu_trending(count: int) -> List[Dict]:
     """
     Get trending anime from Kitsu REST API and pair with genre-matched phonk songs.
@@ -9,16 +13,16 @@ async def _try_kitsu_trending(count: int) -> List[Dict]:
     """
     try:
         # Kitsu trending anime endpoint
-        response = requests.get(
-            'https://kitsu.io/api/edge/trending/anime',
-            params={'limit': count},
-            timeout=15
-        )
+        async def fetch():
+            return await fetch_json(
+                'GET', 'https://kitsu.io/api/edge/trending/anime', KITSU_LIMITER,
+                params={'limit': count}
+            )
         
-        if response.status_code != 200:
+        data = await cached_json(f"kitsu:trending:{count}", TRENDING_TTL, fetch)
+        if not data:
             return []
         
-        data = response.json()
         anime_list = data.get('data', [])
         
         # Generate videos with genre-matched songs
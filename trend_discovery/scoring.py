@@ -1,6 +1,49 @@
 from typing import List, Dict
-import random
+import numpy as np
 from datetime import datetime
+from trend_discovery.utils import _fast_yyyymmdd
+
+# Shared generator for the temperature-based anime sampling
+_RNG = np.random.default_rng()
+
+def _upload_ordinal(upload_date: str) -> float:
+    """Day ordinal of a YYYYMMDD upload date, or NaN when missing/invalid."""
+    if not upload_date or len(upload_date) != 8:
+        return np.nan
+    try:
+        return _fast_yyyymmdd(upload_date).toordinal()
+    except (ValueError, TypeError):
+        return np.nan
+
+def _compute_scores(views: np.ndarray, likes: np.ndarray, recency_part: np.ndarray,
+                    song_counts: np.ndarray, song_ids: np.ndarray, max_views: float) -> np.ndarray:
+    """
+    Weighted score per short, accumulated in place into one buffer.
+    recency_part is the already weighted (x0.2) recency term.
+    """
+    # 1. Views (40% weight)
+    if max_views > 0:
+        scores = np.divide(views, max_views)
+    else:
+        scores = np.zeros(len(views))
+    scores *= 0.4
+    
+    # 2. Engagement rate (30% weight), 15% likes/views is excellent
+    engagement = np.zeros(len(views))
+    np.divide(likes, views, out=engagement, where=views > 0)
+    engagement /= 0.15
+    np.minimum(engagement, 1.0, out=engagement)
+    engagement *= 0.3
+    scores += engagement
+    
+    # 3. Recency (20% weight)
+    scores += recency_part
+    
+    # 4. Uniqueness (10% weight): less saturated songs score higher
+    uniqueness = np.reciprocal(song_counts[song_ids].astype(np.float64))
+    uniqueness *= 0.1
+    scores += uniqueness
+    return scores
 
 def score_shorts(shorts: List[Dict], temperature=0.5) -> List[Dict]:
     """
@@ -17,63 +60,36 @@ def score_shorts(shorts: List[Dict], temperature=0.5) -> List[Dict]:
     if not shorts:
         return []
     
-    # Calculate max values for normalization
-    max_views = max(s.get('view_count', 1) for s in shorts)
-    
-    # Track song frequency for uniqueness bonus
-    song_counts = {}
-    for short in shorts:
-        song_key = f"{short.get('sound_title', '')}_{short.get('sound_author', '')}"
-        song_counts[song_key] = song_counts.get(song_key, 0) + 1
-    
-    # Score each short
-    for short in shorts:
-        score = 0.0
-        
-        # 1. Views (40% weight)
-        views = short.get('view_count', 0)
-        view_score = (views / max_views) if max_views > 0 else 0
-        score += view_score * 0.4
-        
-        # 2. Engagement rate (30% weight)
-        likes = short.get('like_count', 0)
-        if views > 0:
-            engagement = likes / views
-            engagement_score = min(1.0, engagement / 0.15)  # 15% is excellent
-            score += engagement_score * 0.3
-        
-        # 3. Recency (20% weight)
-        upload_date = short.get('upload_date', '')
-        if upload_date and len(upload_date) == 8:
-            try:
-                upload_dt = datetime.strptime(upload_date, '%Y%m%d')
-                days_old = (datetime.now() - upload_dt).days
-                
-                if days_old <= 7:
-                    recency_score = 1.0
-                elif days_old <= 30:
-                    recency_score = 0.8
-                elif days_old <= 90:
-                    recency_score = 0.5
-                else:
-                    recency_score = 0.2
-                
-                score += recency_score * 0.2
-            except:
-                score += 0.1
-        else:
-            score += 0.1
-        
-        # 4. Uniqueness (10% weight)
-        song_key = f"{short.get('sound_title', '')}_{short.get('sound_author', '')}"
-        song_count = song_counts.get(song_key, 1)
-        uniqueness_score = 1.0 / song_count  # Less saturated = higher score
-        score += uniqueness_score * 0.1
-        
+    # Column (struct-of-arrays) view of the fields we score on
+    n = len(shorts)
+    views = np.fromiter((s.get('view_count', 0) for s in shorts), dtype=np.float64, count=n)
+    likes = np.fromiter((s.get('like_count', 0) for s in shorts), dtype=np.float64, count=n)
+    upload_days = np.fromiter((_upload_ordinal(s.get('upload_date', '')) for s in shorts), dtype=np.float64, count=n)
+    
+    # Max views for normalization, from the column instead of another pass
+    max_views = views.max()
+    
+    # Song id per short, for the uniqueness bonus
+    song_index = {}
+    song_ids = np.fromiter(
+        (song_index.setdefault(f"{s.get('sound_title', '')}_{s.get('sound_author', '')}", len(song_index)) for s in shorts),
+        dtype=np.int64, count=n
+    )
+    song_counts = np.bincount(song_ids)
+    
+    # Recency buckets; unknown upload dates get a flat 0.1 instead
+    days_old = datetime.now().toordinal() - upload_days
+    recency_score = np.select([days_old <= 7, days_old <= 30, days_old <= 90], [1.0, 0.8, 0.5], 0.2)
+    recency_part = np.where(np.isnan(upload_days), 0.1, recency_score * 0.2)
+    
+    scores = _compute_scores(views, likes, recency_part, song_counts, song_ids, max_views)
+    
+    for short, score in zip(shorts, scores.tolist()):
         short['final_score'] = score
     
-    # Sort by score (highest first)
-    shorts.sort(key=lambda x: x.get('final_score', 0), reverse=True)
+    # Sort by score (highest first, ties keep their order)
+    order = np.argsort(-scores, kind='stable')
+    shorts[:] = [shorts[i] for i in order]
     
     return shorts
 
@@ -132,10 +148,10 @@ def select_diverse_content(scored_shorts: List[Dict], temperature=0.5) -> Dict:
         selected_anime = [anime_scores[0][0]]
         selected_shorts.extend(anime_scores[0][2])
     elif temperature < 0.7:
-        # Medium temp: weighted sampling from top 5
+        # Medium temp: score-weighted sampling of distinct anime from top 5
         top_n = min(5, len(anime_scores))
-        weights = [anime_scores[i][1] for i in range(top_n)]
-        sampled_indices = random.choices(range(top_n), weights=weights, k=min(2, len(anime_scores)))
+        weights = np.fromiter((anime_scores[i][1] for i in range(top_n)), dtype=np.float64, count=top_n)
+        sampled_indices = _RNG.choice(top_n, size=min(2, top_n), replace=False, p=weights / weights.sum())
         for idx in sampled_indices:
             if anime_scores[idx][0] not in selected_anime:
                 selected_anime.append(anime_scores[idx][0])
@@ -143,8 +159,8 @@ def select_diverse_content(scored_shorts: List[Dict], temperature=0.5) -> Dict:
     else:
         # High temp: random from top 10
         top_n = min(10, len(anime_scores))
-        sampled = random.sample(anime_scores[:top_n], min(3, len(anime_scores)))
-        for anime_title, score, shorts in sampled:
+        sampled_indices = _RNG.choice(top_n, size=min(3, top_n), replace=False)
+        for anime_title, score, shorts in (anime_scores[i] for i in sampled_indices):
             selected_anime.append(anime_title)
             selected_shorts.extend(shorts)
     
@@ -0,0 +1,119 @@
+"""
+Shared HTTP session for the whole discovery pipeline: the trending APIs
+(AniList, Kitsu) and Sakugabooru clip downloads.
+"""
+import aiohttp
+import asyncio
+import collections
+import json
+import time
+from typing import Any, Optional
+
+# Default per-request budget; long downloads pass their own timeout
+REQUEST_TIMEOUT = aiohttp.ClientTimeout(total=15)
+
+# Caps on open sockets overall and per host, so bursts stay polite
+MAX_CONNECTIONS = 64
+MAX_CONNECTIONS_PER_HOST = 8
+
+# Retry policy for rate-limited (429) and server-error (5xx) replies
+MAX_RETRIES = 3
+MAX_RETRY_DELAY = 30
+
+class RateLimiter:
+    """
+    Async context manager allowing at most `max_calls` entries per `period`
+    seconds. Calls over the limit wait for their slot instead of failing.
+    """
+    def __init__(self, max_calls: int, period: float):
+        self.max_calls = max_calls
+        self.period = period
+        self._slots = collections.deque()
+    
+    async def __aenter__(self):
+        now = time.monotonic()
+        while self._slots and self._slots[0] <= now - self.period:
+            self._slots.popleft()
+        # Reserve the slot before sleeping, so concurrent callers queue up
+        start = now
+        if len(self._slots) >= self.max_calls:
+            start = self._slots[-self.max_calls] + self.period
+        self._slots.append(start)
+        if start > now:
+            await asyncio.sleep(start - now)
+    
+    async def __aexit__(self, *exc_info):
+        return False
+
+_SESSION: Optional[aiohttp.ClientSession] = None
+_SESSION_LOOP: Optional[asyncio.AbstractEventLoop] = None
+
+async def get_session() -> aiohttp.ClientSession:
+    """
+    Lazily creates the shared session for the running event loop, so every
+    request reuses pooled keep-alive connections and cached DNS lookups.
+    A session left over from an earlier event loop is closed first.
+    """
+    global _SESSION, _SESSION_LOOP
+    loop = asyncio.get_running_loop()
+    if _SESSION is None or _SESSION.closed or _SESSION_LOOP is not loop:
+        if _SESSION is not None and not _SESSION.closed:
+            try:
+                await _SESSION.close()
+            except Exception as e:
+                print(f"    Could not close previous HTTP session: {e}")
+        _SESSION = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=MAX_CONNECTIONS,
+                limit_per_host=MAX_CONNECTIONS_PER_HOST,
+                ttl_dns_cache=300
+            ),
+            timeout=REQUEST_TIMEOUT
+        )
+        _SESSION_LOOP = loop
+    return _SESSION
+
+async def close_session():
+    """Closes the shared session (call once discovery and clip gathering are done)."""
+    global _SESSION, _SESSION_LOOP
+    if _SESSION is not None and not _SESSION.closed:
+        await _SESSION.close()
+    _SESSION = None
+    _SESSION_LOOP = None
+
+def _retry_delay(response: aiohttp.ClientResponse, attempt: int) -> float:
+    """Seconds to wait before retrying: the server's Retry-After, else exponential."""
+    try:
+        return min(MAX_RETRY_DELAY, float(response.headers.get('Retry-After')))
+    except (TypeError, ValueError):
+        return min(MAX_RETRY_DELAY, 2 ** attempt)
+
+async def fetch_json(method: str, url: str, limiter: RateLimiter, **kwargs) -> Optional[Any]:
+    """
+    Sends one rate-limited request on the shared session and parses the JSON
+    reply. 429 and 5xx replies are retried up to MAX_RETRIES times.
+    
+    Args:
+        method: HTTP method ('GET', 'POST')
+        url: Request URL
+        limiter: Per-API rate limiter
+        **kwargs: Passed to session.request (json=, params=, ...)
+    
+    Returns:
+        Parsed JSON, or None on any other non-200 reply
+    """
+    session = await get_session()
+    for attempt in range(MAX_RETRIES + 1):
+        async with limiter:
+            async with session.request(method, url, **kwargs) as response:
+                if response.status == 200:
+                    # Parse the raw bytes directly: skips aiohttp's content-type
+                    # check (Kitsu uses a vendor type) and the charset decode pass
+                    return json.loads(await response.read())
+                if response.status != 429 and response.status < 500:
+                    return None
+                if attempt == MAX_RETRIES:
+                    print(f"    {url} still returned {response.status} after {MAX_RETRIES} retries")
+                    return None
+                delay = _retry_delay(response, attempt)
+        await asyncio.sleep(delay)
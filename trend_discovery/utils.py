@@ -1,10 +1,51 @@
+import functools
 import re
+import zlib
 from typing import List, Dict, Tuple
 from datetime import datetime
 
-def _extract_hashtags(text: str) -> List[str]:
-    """Extract hashtags from text."""
-    return re.findall(r'#(\w+)', text)
+# Known artists database for better matching. A tuple (not a set) so the
+# first match is the same on every run, whatever the hash seed.
+_KNOWN_ARTISTS = (
+    'kordhell', 'dxrk', 'shadowraze', 'playaphonk', 'dvrst', 
+    'pharmacist', 'interworld', 'dxrk ダーク', 'lxst cxntury',
+    'montagem', 'slowed', 'sped up'
+)
+
+# Genre -> vibe lookup sets, checked in this order
+_VIBE_GENRES = (
+    ("high_energy", frozenset({'action', 'shounen', 'super power', 'martial arts'})),
+    ("dark", frozenset({'thriller', 'horror', 'mystery', 'psychological'})),
+    ("epic", frozenset({'fantasy', 'adventure', 'supernatural'})),
+    ("chill", frozenset({'slice of life', 'comedy', 'romance'})),
+)
+
+# Title hints used when an anime has no genres. Matched as substrings
+# ("demons" counts as "demon"), so these stay sequences rather than sets.
+_HIGH_ENERGY_TITLE_WORDS = ('demon', 'slayer', 'attack', 'hero', 'fight')
+_DARK_TITLE_WORDS = ('death', 'dark', 'monster')
+
+# Title patterns, compiled once
+_PAT_DASH = re.compile(r'^([^-|\[]+?)\s*[-–]\s*([^|\[]+?)(?:\s*[\|\[]|$)', re.IGNORECASE)
+_PAT_BY = re.compile(r'["\']?([^"\']+?)["\']?\s+by\s+([^|\[\n]+)', re.IGNORECASE)
+_PAT_X = re.compile(r'([^×x\[]+?)\s*[×x]\s*([^|\[\n]+)', re.IGNORECASE)
+_PAT_FT = re.compile(r'([^(]+?)\s*(?:ft\.?|feat\.?)\s*([^)|\[\n]+)', re.IGNORECASE)
+_PAT_SUFFIX = re.compile(r'\s*[\|\[].*$')
+_PAT_PARENS = re.compile(r'\s*\(.*?\)')
+_PAT_HASHTAG = re.compile(r'#(\w+)')
+
+def _fast_yyyymmdd(upload_date: str) -> datetime:
+    """
+    Parses a YYYYMMDD date (yt-dlp's upload_date) by slicing, much faster than
+    strptime. Raises ValueError like strptime does for malformed dates.
+    """
+    if len(upload_date) != 8 or not (upload_date.isascii() and upload_date.isdigit()):
+        raise ValueError(f"not a YYYYMMDD date: {upload_date!r}")
+    return datetime(int(upload_date[:4]), int(upload_date[4:6]), int(upload_date[6:]))
+
+def _extract_hashtags(*texts: str) -> List[str]:
+    """Extract hashtags from one or more texts, in order."""
+    return [tag for text in texts for tag in _PAT_HASHTAG.findall(text)]
 
 def _enhanced_song_extraction(title: str, description: str) -> Tuple[str, str]:
     """
@@ -28,15 +69,8 @@ def _extract_song_from_title(title: str) -> Tuple[str, str]:
     Extract song name and artist from video title using multiple patterns.
     Returns (song_title, artist).
     """
-    # Known artists database for better matching
-    known_artists = {
-        'kordhell', 'dxrk', 'shadowraze', 'playaphonk', 'dvrst', 
-        'pharmacist', 'interworld', 'dxrk ダーク', 'lxst cxntury',
-        'montagem', 'slowed', 'sped up'
-    }
-    
     # Pattern 1: "Song - Artist" or "Artist - Song"
-    match = re.search(r'^([^-|\[]+?)\s*[-–]\s*([^|\[]+?)(?:\s*[\|\[]|$)', title, re.IGNORECASE)
+    match = _PAT_DASH.search(title)
     if match:
         part1, part2 = match.group(1).strip(), match.group(2).strip()
         
@@ -44,7 +78,7 @@ def _extract_song_from_title(title: str) -> Tuple[str, str]:
         part1_lower = part1.lower()
         part2_lower = part2.lower()
         
-        for artist in known_artists:
+        for artist in _KNOWN_ARTISTS:
             if artist in part1_lower:
                 return part2, part1
             if artist in part2_lower:
@@ -56,24 +90,24 @@ def _extract_song_from_title(title: str) -> Tuple[str, str]:
         return part2, part1
     
     # Pattern 2: "Song by Artist"
-    match = re.search(r'["\']?([^"\']+?)["\']?\s+by\s+([^|\[\n]+)', title, re.IGNORECASE)
+    match = _PAT_BY.search(title)
     if match:
         return match.group(1).strip(), match.group(2).strip()
     
     # Pattern 3: "Artist × Song" or "Artist x Song"
-    match = re.search(r'([^×x\[]+?)\s*[×x]\s*([^|\[\n]+)', title, re.IGNORECASE)
+    match = _PAT_X.search(title)
     if match:
         return match.group(2).strip(), match.group(1).strip()
     
     # Pattern 4: "Song ft. Artist" or "Song feat. Artist"
-    match = re.search(r'([^(]+?)\s*(?:ft\.?|feat\.?)\s*([^)|\[\n]+)', title, re.IGNORECASE)
+    match = _PAT_FT.search(title)
     if match:
         return match.group(1).strip(), match.group(2).strip()
     
     # Fallback: return title as song, Unknown as artist
     # Clean up common suffixes
-    clean_title = re.sub(r'\s*[\|\[].*$', '', title)
-    clean_title = re.sub(r'\s*\(.*?\)', '', clean_title)
+    clean_title = _PAT_SUFFIX.sub('', title)
+    clean_title = _PAT_PARENS.sub('', clean_title)
     clean_title = clean_title.strip()
     
     return clean_title, "Unknown"
@@ -105,7 +139,7 @@ def _calculate_trending_score(
     # Component 3: Recency (20% weight)
     try:
         if upload_date and len(upload_date) == 8:
-            upload_dt = datetime.strptime(upload_date, '%Y%m%d')
+            upload_dt = _fast_yyyymmdd(upload_date)
             days_old = (datetime.now() - upload_dt).days
             
             # Heavily favor recent uploads
@@ -126,102 +160,102 @@ def _calculate_trending_score(
     
     return min(1.0, max(0.0, score))
 
+# Popular phonk/edit songs for pairing with anime. Built once; the dicts are
+# shared by every caller, so treat them as read-only.
+_POPULAR_SONGS: Tuple[Dict, ...] = (
+    {
+        "id": "kordhell_murder",
+        "title": "Murder In My Mind",
+        "author": "Kordhell",
+        "url": "https://www.youtube.com/watch?v=w-sQRS-Lc9k",
+        "vibe": "high_energy"  # Action, epic
+    },
+    {
+        "id": "dxrk_rave",
+        "title": "RAVE",
+        "author": "Dxrk",
+        "url": "https://www.youtube.com/watch?v=VBB1S22vdEI",
+        "vibe": "high_energy"  # Action, intense
+    },
+    {
+        "id": "kordhell_live",
+        "title": "Live Another Day",
+        "author": "Kordhell",
+        "url": "https://www.youtube.com/watch?v=VhB-3LvqJ3o",
+        "vibe": "epic"  # Fantasy, adventure
+    },
+    {
+        "id": "shadowraze_funk",
+        "title": "Funk Estranho",
+        "author": "SHADOWRAZE",
+        "url": "https://www.youtube.com/watch?v=jvwXqT9MTVU",
+        "vibe": "dark"  # Dark, thriller
+    },
+    {
+        "id": "playaphonk_phonky",
+        "title": "PHONKY TOWN",
+        "author": "PlayaPhonk",
+        "url": "https://www.youtube.com/watch?v=7w-YjHHPh7I",
+        "vibe": "chill"  # Slice of life, calm
+    },
+    {
+        "id": "dvrst_close_eyes",
+        "title": "Close Eyes",
+        "author": "DVRST",
+        "url": "https://www.youtube.com/watch?v=ao4RCon11eY",
+        "vibe": "dark"  # Dark, mystery
+    }
+)
+
+# Songs grouped by vibe, in _POPULAR_SONGS order
+_SONGS_BY_VIBE: Dict[str, Tuple[Dict, ...]] = {
+    vibe: tuple(song for song in _POPULAR_SONGS if song['vibe'] == vibe)
+    for vibe in dict.fromkeys(song['vibe'] for song in _POPULAR_SONGS)
+}
+
 def _get_popular_phonk_songs() -> List[Dict]:
     """Returns list of popular phonk/edit songs for pairing with anime."""
-    return [
-        {
-            "id": "kordhell_murder",
-            "title": "Murder In My Mind",
-            "author": "Kordhell",
-            "url": "https://www.youtube.com/watch?v=w-sQRS-Lc9k",
-            "vibe": "high_energy"  # Action, epic
-        },
-        {
-            "id": "dxrk_rave",
-            "title": "RAVE",
-            "author": "Dxrk",
-            "url": "https://www.youtube.com/watch?v=VBB1S22vdEI",
-            "vibe": "high_energy"  # Action, intense
-        },
-        {
-            "id": "kordhell_live",
-            "title": "Live Another Day",
-            "author": "Kordhell",
-            "url": "https://www.youtube.com/watch?v=VhB-3LvqJ3o",
-            "vibe": "epic"  # Fantasy, adventure
-        },
-        {
-            "id": "shadowraze_funk",
-            "title": "Funk Estranho",
-            "author": "SHADOWRAZE",
-            "url": "https://www.youtube.com/watch?v=jvwXqT9MTVU",
-            "vibe": "dark"  # Dark, thriller
-        },
-        {
-            "id": "playaphonk_phonky",
-            "title": "PHONKY TOWN",
-            "author": "PlayaPhonk",
-            "url": "https://www.youtube.com/watch?v=7w-YjHHPh7I",
-            "vibe": "chill"  # Slice of life, calm
-        },
-        {
-            "id": "dvrst_close_eyes",
-            "title": "Close Eyes",
-            "author": "DVRST",
-            "url": "https://www.youtube.com/watch?v=ao4RCon11eY",
-            "vibe": "dark"  # Dark, mystery
-        }
-    ]
+    return list(_POPULAR_SONGS)
 
 def _match_anime_to_song(genres: List[str], anime_title: str) -> Dict:
     """
     Match anime genres to appropriate phonk song vibe.
-    Returns a song dictionary.
+    Returns a song dictionary (shared, don't modify it).
     """
-    songs = _get_popular_phonk_songs()
-    
+    return _match_song_cached(tuple(genres), anime_title)
+
+@functools.lru_cache(maxsize=2048)
+def _match_song_cached(genres: Tuple[str, ...], anime_title: str) -> Dict:
     # Convert genres to lowercase for matching
-    genres_lower = [g.lower() for g in genres]
+    genre_set = {g.lower() for g in genres}
     title_lower = anime_title.lower()
     
-    # Genre-to-vibe mapping
-    if any(g in genres_lower for g in ['action', 'shounen', 'super power', 'martial arts']):
-        vibe = "high_energy"
-    elif any(g in genres_lower for g in ['thriller', 'horror', 'mystery', 'psychological']):
-        vibe = "dark"
-    elif any(g in genres_lower for g in ['fantasy', 'adventure', 'supernatural']):
-        vibe = "epic"
-    elif any(g in genres_lower for g in ['slice of life', 'comedy', 'romance']):
-        vibe = "chill"
-    else:
-        # Default to high_energy for unknown genres (most anime edits are action-focused)
-        vibe = "high_energy"
+    # Genre-to-vibe mapping; default to high_energy for unknown genres
+    # (most anime edits are action-focused)
+    vibe = next((v for v, vibe_genres in _VIBE_GENRES if genre_set & vibe_genres), "high_energy")
     
     # Also check title for hints if no genres provided
     if not genres:
-        if any(word in title_lower for word in ['demon', 'slayer', 'attack', 'hero', 'fight']):
+        if any(word in title_lower for word in _HIGH_ENERGY_TITLE_WORDS):
             vibe = "high_energy"
-        elif any(word in title_lower for word in ['death', 'dark', 'monster']):
+        elif any(word in title_lower for word in _DARK_TITLE_WORDS):
             vibe = "dark"
     
     # Find matching songs by vibe
-    matching_songs = [s for s in songs if s.get('vibe') == vibe]
+    matching_songs = _SONGS_BY_VIBE.get(vibe)
     
     if matching_songs:
         # Use hash of anime title to consistently pick same song for same anime
-        import hashlib
-        hash_val = int(hashlib.md5(anime_title.encode()).hexdigest(), 16)
-        return matching_songs[hash_val % len(matching_songs)]
+        # (CRC32 is stable across runs and far cheaper than MD5)
+        return matching_songs[zlib.crc32(anime_title.encode()) % len(matching_songs)]
     
     # Fallback to first song
-    return songs[0]
+    return _POPULAR_SONGS[0]
 
 def _get_hardcoded_tracks() -> List[Dict]:
     """Final fallback: returns curated list of proven anime edit tracks."""
-    songs = _get_popular_phonk_songs()
-    
     videos = []
-    for song in songs:
+    for song in _POPULAR_SONGS:
         metadata = {
             "video_id": song['id'],
             "video_url": song['url'],
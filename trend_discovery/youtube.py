@@ -1,15 +1,93 @@
-import subprocess
 import json
 import asyncio
-from typing import List, Dict
+import math
+from contextlib import aclosing
+from typing import AsyncIterator, List, Dict
+from trend_discovery.cache import cached_json
 from trend_discovery.utils import _enhanced_song_extraction, _calculate_trending_score, _extract_hashtags
 
+# Fields the Shorts parsers read. yt-dlp prints just these, as one small JSON
+# object per video, instead of the full info dict (formats, thumbnails...)
+YT_DLP_FIELDS = ('id', 'title', 'description', 'duration', 'view_count', 'like_count', 'upload_date', 'uploader', 'channel')
+YT_DLP_TEMPLATE = "%(.{" + ",".join(YT_DLP_FIELDS) + "})j"
+
+# Long descriptions can exceed asyncio's 64 KiB line cap
+YT_DLP_LINE_LIMIT = 16 * 1024 * 1024
+
+# Shorts metadata changes slowly, so per-anime search results are reused for a day
+SHORTS_SEARCH_TTL = 24 * 3600
+
+# Shortlisted videos per requested one that get a full metadata fetch
+DETAIL_FETCH_FACTOR = 1.5
+
+async def _yt_dlp_results(search_queries: List[str], timeout: float, flat: bool = False) -> AsyncIterator[Dict]:
+    """
+    Streams yt-dlp search results as they are printed, without blocking the
+    event loop. All queries go to a single yt-dlp process, so its startup is
+    paid once. Use with contextlib.aclosing() so yt-dlp is stopped as soon as
+    the caller has enough results.
+    
+    Args:
+        search_queries: yt-dlp URLs, e.g. ["ytsearch3:naruto amv shorts"]
+        timeout: Seconds before yt-dlp is stopped (results so far are kept)
+        flat: Only list search entries (id, title, duration, views...) without
+              visiting each video, which is much faster
+    
+    Yields:
+        Dict of the YT_DLP_FIELDS each video has. Queries that fail just
+        yield nothing.
+    """
+    proc = await asyncio.create_subprocess_exec(
+        "yt-dlp",
+        "--print", YT_DLP_TEMPLATE,
+        "--no-download",
+        "--skip-download",
+        *(["--flat-playlist"] if flat else []),
+        *search_queries,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.DEVNULL,
+        limit=YT_DLP_LINE_LIMIT
+    )
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    try:
+        while True:
+            try:
+                line = await asyncio.wait_for(proc.stdout.readline(), deadline - loop.time())
+            except asyncio.TimeoutError:
+                print(f"    yt-dlp timed out after {timeout}s")
+                return
+            if not line:
+                return
+            try:
+                data = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            yield data
+    finally:
+        # Done early, timed out or cancelled: don't leave yt-dlp running
+        if proc.returncode is None:
+            try:
+                proc.kill()
+            except ProcessLookupError:
+                pass
+        await proc.wait()
+
 async def search_shorts_for_anime(anime_title: str, count=3) -> List[Dict]:
     """
     Search YouTube Shorts for a specific anime.
     
     Uses multiple query variations and enhanced metadata extraction.
+    Results are cached on disk for SHORTS_SEARCH_TTL per (anime, count).
     """
+    return await cached_json(
+        f"shorts:{anime_title}:{count}",
+        SHORTS_SEARCH_TTL,
+        lambda: _search_shorts(anime_title, count)
+    )
+
+async def _search_shorts(anime_title: str, count: int) -> List[Dict]:
+    """Runs the yt-dlp searches behind search_shorts_for_anime."""
     try:
         # Try multiple search queries
         queries = [
@@ -21,87 +99,59 @@ async def search_shorts_for_anime(anime_title: str, count=3) -> List[Dict]:
         all_shorts = []
         seen_ids = set()
         
-        for query in queries:
-            search_query = f"ytsearch{count}:{query}"
-            
-            cmd = [
-                "yt-dlp",
-                "--dump-json",
-                "--no-download",
-                "--skip-download",
-                search_query
-            ]
-            
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                timeout=30
-            )
-            
-            if result.returncode != 0:
-                continue
-            
-            for line in result.stdout.strip().split('\n'):
-                if not line:
+        # One yt-dlp run for all variations; results stream back in query
+        # order and yt-dlp is stopped once there are enough shorts
+        search_queries = [f"ytsearch{count}:{query}" for query in queries]
+        async with aclosing(_yt_dlp_results(search_queries, timeout=30 * len(queries))) as results:
+            async for data in results:
+                video_id = data.get('id', '')
+                if video_id in seen_ids:
                     continue
-                try:
-                    data = json.loads(line)
-                    
-                    video_id = data.get('id', '')
-                    if video_id in seen_ids:
-                        continue
-                    seen_ids.add(video_id)
-                    
-                    # Filter for Shorts (< 60s) and minimum views
-                    duration = data.get('duration') or 0
-                    view_count = data.get('view_count') or 0
-                    
-                    if duration <= 0 or duration >= 60:
-                        continue
-                    if view_count < 10000:  # Minimum 10K views
-                        continue
-                    
-                    title = data.get('title', 'Unknown')
-                    description = data.get('description', '')
-                    uploader = data.get('uploader', data.get('channel', 'Unknown'))
-                    like_count = data.get('like_count') or 0
-                    upload_date = data.get('upload_date', '')
-                    
-                    # Enhanced song extraction
-                    sound_title, sound_author = _enhanced_song_extraction(title, description)
-                    
-                    # Calculate trending score
-                    trending_score = _calculate_trending_score(
-                        view_count, like_count, upload_date, duration
-                    )
-                    
-                    metadata = {
-                        "video_id": video_id,
-                        "video_url": f"https://www.youtube.com/watch?v={video_id}",
-                        "sound_id": video_id,
-                        "sound_title": sound_title,
-                        "sound_author": sound_author,
-                        "caption": title,
-                        "anime_title": anime_title,  # Track which anime this is for
-                        "duration": duration,
-                        "view_count": view_count,
-                        "like_count": like_count,
-                        "upload_date": upload_date,
-                        "channel_name": uploader,
-                        "source": "youtube_shorts",
-                        "trending_score": trending_score
-                    }
-                    all_shorts.append(metadata)
-                    
-                    if len(all_shorts) >= count:
-                        break
-                        
-                except json.JSONDecodeError:
+                seen_ids.add(video_id)
+                
+                # Filter for Shorts (< 60s) and minimum views
+                duration = data.get('duration') or 0
+                view_count = data.get('view_count') or 0
+                
+                if duration <= 0 or duration >= 60:
                     continue
-            
-            if len(all_shorts) >= count:
-                break
+                if view_count < 10000:  # Minimum 10K views
+                    continue
+                
+                title = data.get('title', 'Unknown')
+                description = data.get('description', '')
+                uploader = data.get('uploader', data.get('channel', 'Unknown'))
+                like_count = data.get('like_count') or 0
+                upload_date = data.get('upload_date', '')
+                
+                # Enhanced song extraction
+                sound_title, sound_author = _enhanced_song_extraction(title, description)
+                
+                # Calculate trending score
+                trending_score = _calculate_trending_score(
+                    view_count, like_count, upload_date, duration
+                )
+                
+                metadata = {
+                    "video_id": video_id,
+                    "video_url": f"https://www.youtube.com/watch?v={video_id}",
+                    "sound_id": video_id,
+                    "sound_title": sound_title,
+                    "sound_author": sound_author,
+                    "caption": title,
+                    "anime_title": anime_title,  # Track which anime this is for
+                    "duration": duration,
+                    "view_count": view_count,
+                    "like_count": like_count,
+                    "upload_date": upload_date,
+                    "channel_name": uploader,
+                    "source": "youtube_shorts",
+                    "trending_score": trending_score
+                }
+                all_shorts.append(metadata)
+                
+                if len(all_shorts) >= count:
+                    break
         
         return all_shorts[:count]
         
@@ -119,38 +169,38 @@ async def _try_youtube_shorts_scrape(count: int, max_retries: int = 3) -> List[D
             # Search for more videos than needed to allow filtering
             search_query = f"ytsearch{count * 3}:anime edit shorts"
             
-            # Use yt-dlp to get full metadata (not flat-playlist for more data)
-            cmd = [
-                "yt-dlp",
-                "--dump-json",
-                "--no-download",
-                "--skip-download",
-                search_query
-            ]
-            
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                timeout=60
-            )
+            # Cheap flat listing first, so full metadata is only fetched for
+            # the most viewed entries that can be Shorts
+            listed = 0
+            candidates = []
+            async with aclosing(_yt_dlp_results([search_query], timeout=60, flat=True)) as listing:
+                async for entry in listing:
+                    listed += 1
+                    duration = entry.get('duration')
+                    if entry.get('id') and (duration is None or 0 < duration < 60):
+                        candidates.append(entry)
             
-            if result.returncode != 0:
+            # Nothing came back (yt-dlp failed or timed out)
+            if not listed:
                 if attempt < max_retries - 1:
                     await asyncio.sleep(2 ** attempt)  # Exponential backoff
                     continue
                 return []
+            if not candidates:
+                return []
+            
+            candidates.sort(key=lambda entry: entry.get('view_count') or 0, reverse=True)
+            detail_urls = [
+                f"https://www.youtube.com/watch?v={entry['id']}"
+                for entry in candidates[:math.ceil(count * DETAIL_FETCH_FACTOR)]
+            ]
             
-            # Parse JSON lines output
             videos = []
             seen_ids = set()
             
-            for line in result.stdout.strip().split('\n'):
-                if not line:
-                    continue
-                try:
-                    data = json.loads(line)
-                    
+            # Full metadata (not flat-playlist) for the shortlisted videos only
+            async with aclosing(_yt_dlp_results(detail_urls, timeout=60)) as results:
+                async for data in results:
                     # Extract basic metadata
                     video_id = data.get('id', '')
                     if video_id in seen_ids:
@@ -170,7 +220,7 @@ async def _try_youtube_shorts_scrape(count: int, max_retries: int = 3) -> List[D
                     upload_date = data.get('upload_date', '')  # YYYYMMDD format
                     
                     # Extract hashtags from title and description
-                    hashtags = _extract_hashtags(title + ' ' + description)
+                    hashtags = _extract_hashtags(title, description)
                     
                     # Enhanced song extraction (tries title first, then description)
                     sound_title, sound_author = _enhanced_song_extraction(title, description)
@@ -201,20 +251,18 @@ async def _try_youtube_shorts_scrape(count: int, max_retries: int = 3) -> List[D
                     
                     if len(videos) >= count:
                         break
-                        
-                except json.JSONDecodeError:
+            
+            # Nothing came back (yt-dlp failed or timed out)
+            if not seen_ids:
+                if attempt < max_retries - 1:
+                    await asyncio.sleep(2 ** attempt)  # Exponential backoff
                     continue
+                return []
             
             # Sort by trending score (highest first)
             videos.sort(key=lambda x: x['trending_score'], reverse=True)
             return videos[:count]
             
-        except subprocess.TimeoutExpired:
-            if attempt < max_retries - 1:
-                await asyncio.sleep(2 ** attempt)
-                continue
-            print("    YouTube scraping timed out after retries")
-            return []
         except Exception as e:
             if attempt < max_retries - 1:
                 await asyncio.sleep(2 ** attempt)
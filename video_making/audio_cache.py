@@ -0,0 +1,45 @@
+"""
+Shared audio decoding so one song is decoded once per run, not once per analysis step.
+"""
+import functools
+import imageio_ffmpeg
+import numpy as np
+import os
+import subprocess
+
+# Same rate MoviePy's AudioFileClip decodes at by default
+DEFAULT_SR = 44100
+
+def _decode_mono(audio_path: str, sr: int) -> np.ndarray:
+    """
+    Decodes an audio file straight to mono float32 samples at `sr` Hz via
+    ffmpeg, instead of a full-rate stereo float64 decode.
+    """
+    cmd = [
+        imageio_ffmpeg.get_ffmpeg_exe(), "-v", "error",
+        "-i", audio_path,
+        "-f", "s16le", "-ac", "1", "-ar", str(sr), "-"
+    ]
+    pcm = subprocess.run(cmd, check=True, capture_output=True).stdout
+    return np.frombuffer(pcm, dtype=np.int16).astype(np.float32) / 32768.0
+
+@functools.lru_cache(maxsize=4)
+def _load_cached(audio_path: str, mtime: float, sr: int) -> np.ndarray:
+    samples = _decode_mono(audio_path, sr)
+    # Shared between callers, so make accidental in-place edits fail loudly
+    samples.flags.writeable = False
+    return samples
+
+def load_audio_once(audio_path: str, sr: int = DEFAULT_SR) -> tuple[np.ndarray, int]:
+    """
+    Decodes an audio file to mono float32, reusing the result for repeated
+    calls on the same unchanged file.
+    
+    Args:
+        audio_path: Path to audio file
+        sr: Sample rate to decode at
+    
+    Returns:
+        (samples, sample rate) - samples are read-only
+    """
+    return _load_cached(audio_path, os.path.getmtime(audio_path), sr), sr
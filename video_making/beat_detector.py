@@ -3,93 +3,56 @@ Beat detection using MoviePy and numpy for Python 3.14 compatibility.
 """
 import numpy as np
 from moviepy import AudioFileClip
+from video_making.audio_cache import DEFAULT_SR, load_audio_once
+from video_making.disk_cache import disk_cache, file_fingerprint
 
-def detect_beats(audio_path: str, min_interval_s:float = 0.3) -> dict:
+def _to_mono(audio_array: np.ndarray) -> np.ndarray:
+    """
+    Downmixes a (samples, channels) array to mono float32 in a single pass
+    into one preallocated buffer, without a float64 temporary.
+    """
+    if audio_array.ndim == 1:
+        return audio_array.astype(np.float32, copy=False)
+    mono = np.empty(audio_array.shape[0], dtype=np.float32)
+    np.sum(audio_array, axis=1, dtype=np.float32, out=mono)
+    mono *= 1.0 / audio_array.shape[1]
+    return mono
+
+def _nearby_max(energies: np.ndarray, radius: int) -> np.ndarray:
+    """
+    Max of energies[i - radius : i + radius] (clipped to the array) for every
+    i, computed over sliding windows instead of a Python loop per chunk.
+    """
+    if radius <= 0 or len(energies) == 0:
+        return np.full(len(energies), -np.inf, dtype=energies.dtype)
+    padded = np.concatenate((
+        np.full(radius, -np.inf, dtype=energies.dtype),
+        energies,
+        np.full(radius - 1, -np.inf, dtype=energies.dtype)
+    ))
+    return np.lib.stride_tricks.sliding_window_view(padded, 2 * radius).max(axis=1)
+
+def detect_beats(audio_path: str, min_interval_s:float = 0.3, audio: tuple = None) -> dict:
     """
     Detects beats in an audio file using energy-based peak detection.
+    Results are cached on disk per audio file, sample rate and min_interval_s;
+    if analysis fails, evenly spaced fallback beats are returned (never cached).
     
     Args:
         audio_path: Path to audio file
         min_interval_s: Minimum time between beats in seconds
+        audio: Already decoded (mono samples, sample rate) for audio_path (optional)
     
     Returns:
         dict: {
             'beat_times': list of beat timestamps in seconds,
             'tempo': estimated BPM,
-            'beat_frames': beat indices
+            'beat_frames': beat indices,
+            'intensities': get_audio_intensity_segments() values for beat_times
         }
     """
     try:
-        # Load audio using MoviePy
-        audio_clip = AudioFileClip(audio_path)
-        
-        # Get audio as numpy array
-        fps = audio_clip.fps  # Sample rate
-        audio_array = audio_clip.to_soundarray(fps=fps)
-        
-        # Convert to mono if stereo
-        if len(audio_array.shape) > 1 and audio_array.shape[1] > 1:
-            audio_array = np.mean(audio_array, axis=1)
-        
-        # Chunk size for analysis (50ms chunks)
-        chunk_duration = 0.05  # 50ms
-        chunk_samples = int(fps * chunk_duration)
-        
-        # Calculate energy for each chunk
-        energies = []
-        num_chunks = len(audio_array) // chunk_samples
-        
-        for i in range(num_chunks):
-            start_idx = i * chunk_samples
-            end_idx = start_idx + chunk_samples
-            chunk = audio_array[start_idx:end_idx]
-            
-            # Calculate RMS energy
-            energy = np.sqrt(np.mean(chunk**2))
-            energies.append(energy)
-        
-        energies = np.array(energies)
-        
-        # Find peaks in energy (potential beats)
-        # Use adaptive threshold
-        threshold = np.mean(energies) + 0.5 * np.std(energies)
-        
-        beat_chunks = []
-        min_interval_chunks = int(min_interval_s / chunk_duration)
-        
-        for i in range(len(energies)):
-            # Check if this is a local maximum above threshold
-            if energies[i] > threshold:
-                is_peak = True
-                # Check if there's a higher peak nearby
-                start = max(0, i - min_interval_chunks)
-                end = min(len(energies), i + min_interval_chunks)
-                for j in range(start, end):
-                    if j != i and energies[j] > energies[i]:
-                        is_peak = False
-                        break
-                
-                if is_peak:
-                    beat_chunks.append(i)
-        
-        # Convert chunk indices to time
-        beat_times = [chunk_idx * chunk_duration for chunk_idx in beat_chunks]
-        
-        # Estimate tempo from beat intervals
-        if len(beat_times) > 1:
-            intervals = np.diff(beat_times)
-            avg_interval = np.median(intervals)
-            tempo = 60.0 / avg_interval if avg_interval > 0 else 120.0
-        else:
-            tempo = 120.0
-        
-        audio_clip.close()
-        
-        return {
-            'beat_times': beat_times,
-            'tempo': float(tempo),
-            'beat_frames': beat_chunks
-        }
+        return _detect_beats(audio_path, min_interval_s, audio)
     except Exception as e:
         print(f"Error detecting beats: {e}")
         import traceback
@@ -105,49 +68,104 @@ def detect_beats(audio_path: str, min_interval_s:float = 0.3) -> dict:
         return {
             'beat_times': fallback_beats,
             'tempo': 120.0,
-            'beat_frames': list(range(len(fallback_beats)))
+            'beat_frames': list(range(len(fallback_beats))),
+            'intensities': [0.5] * max(0, len(fallback_beats) - 1)
         }
 
-def get_audio_intensity_segments(audio_path: str, beat_times: list) -> list:
+@disk_cache(key=lambda audio_path, min_interval_s, audio: (
+    file_fingerprint(audio_path), min_interval_s, audio[1] if audio is not None else DEFAULT_SR
+))
+def _detect_beats(audio_path: str, min_interval_s: float, audio: tuple) -> dict:
+    """detect_beats() without the fallback, so failures raise instead of being cached."""
+    # Decoded mono samples (shared with the other analysis steps)
+    audio_array, fps = audio if audio is not None else load_audio_once(audio_path)
+    audio_array = _to_mono(audio_array)
+    
+    # Chunk size for analysis (50ms chunks)
+    chunk_duration = 0.05  # 50ms
+    chunk_samples = int(fps * chunk_duration)
+    
+    # RMS energy for each chunk, all chunks at once as rows of a 2D view
+    # (row-wise dot products, so no squared copy of the whole song)
+    num_chunks = len(audio_array) // chunk_samples
+    chunks = audio_array[:num_chunks * chunk_samples].reshape(num_chunks, chunk_samples)
+    energies = np.sqrt(np.einsum('ij,ij->i', chunks, chunks) / np.float32(chunk_samples))
+    
+    # Find peaks in energy (potential beats)
+    # Use adaptive threshold
+    threshold = np.mean(energies) + 0.5 * np.std(energies)
+    
+    # A beat is a chunk above threshold with no higher chunk nearby
+    min_interval_chunks = int(min_interval_s / chunk_duration)
+    nearby_max = _nearby_max(energies, min_interval_chunks)
+    beat_chunks = np.flatnonzero((energies > threshold) & (energies >= nearby_max)).tolist()
+    
+    # Convert chunk indices to time
+    beat_times = [chunk_idx * chunk_duration for chunk_idx in beat_chunks]
+    
+    # RMS between consecutive beats from the chunk energies (beats sit on
+    # chunk boundaries), so the intensities need no second pass over the audio
+    squared_sums = np.concatenate(([0.0], np.cumsum(np.square(energies, dtype=np.float64))))
+    beat_idx = np.asarray(beat_chunks, dtype=np.intp)
+    starts, ends = beat_idx[:-1], beat_idx[1:]
+    intensities = np.sqrt((squared_sums[ends] - squared_sums[starts]) / (ends - starts))
+    if len(intensities) and intensities.max() > 0:
+        intensities /= intensities.max()
+    
+    # Estimate tempo from beat intervals
+    if len(beat_times) > 1:
+        intervals = np.diff(beat_times)
+        avg_interval = np.median(intervals)
+        tempo = 60.0 / avg_interval if avg_interval > 0 else 120.0
+    else:
+        tempo = 120.0
+    
+    return {
+        'beat_times': beat_times,
+        'tempo': float(tempo),
+        'beat_frames': beat_chunks,
+        'intensities': intensities.tolist()
+    }
+
+def get_audio_intensity_segments(audio_path: str, beat_times: list, audio: tuple = None) -> list:
     """
     Calculates the intensity (RMS energy) of audio segments between beats.
     
+    Args:
+        audio_path: Path to audio file
+        beat_times: Beat timestamps in seconds
+        audio: Already decoded (mono samples, sample rate) for audio_path (optional)
+    
     Returns:
         list: Intensity values (0.0-1.0) for each segment between beats
     """
     try:
-        audio_clip = AudioFileClip(audio_path)
-        fps = audio_clip.fps
-        audio_array = audio_clip.to_soundarray(fps=fps)
-        
-        # Convert to mono if stereo
-        if len(audio_array.shape) > 1 and audio_array.shape[1] > 1:
-            audio_array = np.mean(audio_array, axis=1)
-        
-        intensities = []
-        for i in range(len(beat_times) - 1):
-            start_sample = int(beat_times[i] * fps)
-            end_sample = int(beat_times[i + 1] * fps)
-            
-            if end_sample > len(audio_array):
-                end_sample = len(audio_array)
-            
-            segment = audio_array[start_sample:end_sample]
-            
-            if len(segment) > 0:
-                rms = np.sqrt(np.mean(segment**2))
-                intensities.append(float(rms))
-            else:
-                intensities.append(0.0)
+        audio_array, fps = audio if audio is not None else load_audio_once(audio_path)
+        audio_array = _to_mono(audio_array)
+        
+        if len(beat_times) < 2:
+            return []
+        
+        # Sample index of every beat; segment i spans bounds[i]:bounds[i + 1]
+        bounds = (np.asarray(beat_times, dtype=np.float64) * fps).astype(np.int64)
+        np.clip(bounds, 0, len(audio_array), out=bounds)
+        counts = np.diff(bounds)
+        
+        # Sum of squares for all non-empty segments in one reduceat call
+        # (beats are sorted, so those segments tile bounds[0]:bounds[-1])
+        intensities = np.zeros(len(counts))
+        nonempty = counts > 0
+        if nonempty.any():
+            squared = np.square(audio_array[bounds[0]:bounds[-1]])
+            sums = np.add.reduceat(squared, bounds[:-1][nonempty] - bounds[0])
+            intensities[nonempty] = np.sqrt(sums / counts[nonempty])
         
         # Normalize to 0-1 range
-        if intensities:
-            max_intensity = max(intensities)
-            if max_intensity > 0:
-                intensities = [i / max_intensity for i in intensities]
+        max_intensity = intensities.max()
+        if max_intensity > 0:
+            intensities /= max_intensity
         
-        audio_clip.close()
-        return intensities
+        return intensities.tolist()
     except Exception as e:
         print(f"Error calculating audio intensity: {e}")
         import traceback
@@ -0,0 +1,66 @@
+"""
+On-disk memoization for expensive, deterministic analysis steps, so rendering
+several edits of the same song doesn't redo the same work.
+"""
+import functools
+import hashlib
+import json
+import os
+import time
+
+CACHE_DIR = os.path.expanduser("~/.cache/anime_edit")
+
+# Leading bytes hashed to fingerprint a file (plus its size)
+FINGERPRINT_BYTES = 1 << 20
+
+def file_fingerprint(path: str) -> str:
+    """
+    Identifies a file by its size and the SHA-1 of its first megabyte,
+    which is enough to tell songs apart without hashing whole files.
+    """
+    digest = hashlib.sha1(str(os.path.getsize(path)).encode())
+    with open(path, 'rb') as f:
+        digest.update(f.read(FINGERPRINT_BYTES))
+    return digest.hexdigest()
+
+def disk_cache(key, max_age: float = None):
+    """
+    Caches a function's JSON-serializable result on disk.
+    
+    Args:
+        key: Called with the function's arguments; returns a value whose
+             repr() identifies the result (e.g. a file fingerprint + params)
+        max_age: Seconds before a cached result is recomputed (None = never)
+    
+    Cache problems never break the call: unreadable or unwritable entries
+    just fall back to running the function.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                digest = hashlib.sha1(repr(key(*args, **kwargs)).encode()).hexdigest()
+            except Exception:
+                return func(*args, **kwargs)
+            
+            cache_path = os.path.join(CACHE_DIR, func.__name__, f"{digest}.json")
+            try:
+                if max_age is None or time.time() - os.path.getmtime(cache_path) < max_age:
+                    with open(cache_path) as f:
+                        return json.load(f)
+            except (OSError, ValueError):
+                pass
+            
+            result = func(*args, **kwargs)
+            
+            try:
+                os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+                tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+                with open(tmp_path, 'w') as f:
+                    json.dump(result, f)
+                os.replace(tmp_path, cache_path)
+            except (OSError, TypeError, ValueError) as e:
+                print(f"⚠️  Could not cache {func.__name__} result: {e}")
+            return result
+        return wrapper
+    return decorator
@@ -1,10 +1,315 @@
 """
 Executor Agent - Performs video editing based on orchestrator's plan.
 """
-from moviepy import VideoFileClip, AudioFileClip, concatenate_videoclips, vfx, afx
+from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+import cv2
+import functools
+import imageio_ffmpeg
 import numpy as np
 import os
+import queue
 import random
+import shutil
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+OUTPUT_FPS = 24
+OUTPUT_WIDTH = 720
+OUTPUT_HEIGHT = 1280
+
+# Shared encode settings so every temp clip can be stream-copied by the concat demuxer
+X264_ARGS = ["-c:v", "libx264", "-preset", "veryfast", "-pix_fmt", "yuv420p"]
+
+# Hardware H.264 encoders for the final render, in order of preference.
+# At these settings they are several times faster than x264 but give
+# somewhat larger files at the same visual quality.
+HW_ENCODERS = {
+    "h264_nvenc": ["-preset", "p4", "-rc", "vbr", "-cq", "23", "-pix_fmt", "yuv420p"],
+    "h264_qsv": ["-preset", "veryfast", "-global_quality", "23", "-pix_fmt", "yuv420p"],
+    "h264_vaapi": ["-vaapi_device", "/dev/dri/renderD128", "-vf", "format=nv12,hwupload", "-qp", "23"],
+}
+
+# Frames buffered between each stage of process_video_threaded
+FRAME_QUEUE_SIZE = 16
+
+# x1.3 brightness flash as a uint8 lookup table (saturating at 255)
+FLASH_LUT = np.minimum(np.arange(256, dtype=np.uint16) * 13 // 10, 255).astype(np.uint8)
+
+def _run_ffmpeg(*args: str):
+    """Runs the bundled ffmpeg binary, raising CalledProcessError on failure."""
+    cmd = [imageio_ffmpeg.get_ffmpeg_exe(), "-hide_banner", "-loglevel", "error", "-y", *args]
+    subprocess.run(cmd, check=True, capture_output=True)
+
+def _loop_ffmpeg(in_path: str, loops: int, out_duration: float, out_path: str) -> str:
+    """Repeats a clip `loops` times and cuts it to `out_duration` without re-encoding."""
+    _run_ffmpeg(
+        "-stream_loop", str(loops - 1), "-i", in_path,
+        "-t", f"{out_duration:.3f}", "-c", "copy", out_path
+    )
+    return out_path
+
+@functools.lru_cache(maxsize=None)
+def _final_encoder() -> tuple[str, list[str]]:
+    """
+    Picks the first hardware H.264 encoder that ffmpeg lists and that can
+    actually open on this machine, falling back to libx264.
+    
+    Returns:
+        (codec, extra ffmpeg params)
+    """
+    ffmpeg = imageio_ffmpeg.get_ffmpeg_exe()
+    try:
+        listed = subprocess.run(
+            [ffmpeg, "-hide_banner", "-encoders"], capture_output=True, text=True
+        ).stdout
+    except Exception:
+        listed = ""
+    
+    for codec, params in HW_ENCODERS.items():
+        if codec not in listed:
+            continue
+        # Listed only means compiled in; encode one tiny frame to be sure
+        test = subprocess.run(
+            [ffmpeg, "-hide_banner", "-loglevel", "error",
+             "-f", "lavfi", "-i", "color=s=256x256:d=0.1,format=rgb24",
+             "-frames:v", "1", "-c:v", codec, *params, "-f", "null", "-"],
+            capture_output=True
+        )
+        if test.returncode == 0:
+            return codec, params
+    return "libx264", ["-pix_fmt", "yuv420p"]
+
+def _parse_probe(path: str) -> tuple[int, int, float]:
+    """
+    Reads (width, height, duration) from a clip's header with a single
+    ffmpeg call. The bundled ffmpeg has no ffprobe, so this uses MoviePy's
+    header parser instead of constructing a full VideoFileClip.
+    """
+    infos = ffmpeg_parse_infos(path)
+    width, height = infos['video_size']
+    if abs(infos.get('video_rotation', 0)) in (90, 270):
+        width, height = height, width
+    return int(width), int(height), float(infos['duration'])
+
+@functools.lru_cache(maxsize=256)
+def _probe_cached(path: str, mtime: float) -> tuple[int, int, float]:
+    return _parse_probe(path)
+
+def _probe(path: str) -> tuple[int, int, float]:
+    """_parse_probe() memoized per unchanged source clip (re-downloads are re-probed)."""
+    return _probe_cached(path, os.path.getmtime(path))
+
+def _crop_filter(width: int, height: int) -> str:
+    """
+    Builds the ffmpeg crop for a 9:16 frame, keeping a small margin so
+    subjects near the edges are not cut off. Sizes and offsets are even
+    integers so the crop lines up with 4:2:0 chroma.
+    """
+    target_ratio = 9/16
+    if width / height > target_ratio:
+        new_width = int(min(height * target_ratio * 1.1, width)) & ~1
+        return f"crop={new_width}:{height & ~1}:{((width - new_width) // 2) & ~1}:0"
+    new_height = int(min(width / target_ratio * 0.9, height)) & ~1
+    return f"crop={width & ~1}:{new_height}:0:{((height - new_height) // 2) & ~1}"
+
+def _zoom_frame(frame: np.ndarray, scale: float, out: np.ndarray = None) -> np.ndarray:
+    """
+    Zooms a frame by `scale` around its center, keeping the original size.
+    Crops the visible center first so only output-sized pixels are resampled,
+    writing into `out` when given.
+    """
+    h, w = frame.shape[:2]
+    crop_h = int(round(h / scale))
+    crop_w = int(round(w / scale))
+    y0 = (h - crop_h) // 2
+    x0 = (w - crop_w) // 2
+    return cv2.resize(
+        frame[y0:y0 + crop_h, x0:x0 + crop_w], (w, h),
+        dst=out, interpolation=cv2.INTER_LINEAR
+    )
+
+def _read_frames(input_args: list[str], path: str, output_args: list[str], size: tuple[int, int]):
+    """Yields RGB uint8 frames decoded (and filtered) by ffmpeg."""
+    width, height = size
+    frame_bytes = width * height * 3
+    proc = subprocess.Popen(
+        [imageio_ffmpeg.get_ffmpeg_exe(), "-hide_banner", "-loglevel", "error",
+         *input_args, "-i", path, *output_args, "-an", "-f", "rawvideo", "-pix_fmt", "rgb24", "-"],
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+    )
+    try:
+        while len(raw := proc.stdout.read(frame_bytes)) == frame_bytes:
+            yield np.frombuffer(raw, dtype=np.uint8).reshape(height, width, 3)
+    finally:
+        proc.stdout.close()
+        if proc.poll() is None:
+            proc.kill()
+        proc.wait()
+
+def process_video_threaded(frames, size: tuple[int, int], callback, out_path: str, queue_size: int = FRAME_QUEUE_SIZE):
+    """
+    Renders `frames` through `callback(frame, idx)` with decode, effects and
+    encode overlapped: a reader thread decodes frames, the calling thread
+    runs the callback and a writer thread feeds them to ffmpeg.
+    
+    Args:
+        frames: Iterable of RGB uint8 frames (e.g. clip.iter_frames())
+        size: Frame size as (width, height)
+        callback: Function taking (frame, frame_index) and returning the new frame
+        out_path: Output mp4 path
+        queue_size: Max frames buffered between stages
+    """
+    read_q = queue.Queue(maxsize=queue_size)
+    write_q = queue.Queue(maxsize=queue_size)
+    errors = []
+    
+    def reader():
+        try:
+            for frame in frames:
+                read_q.put(frame)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            read_q.put(None)
+    
+    def writer():
+        frames = imageio_ffmpeg.write_frames(
+            out_path, size, fps=OUTPUT_FPS, codec="libx264",
+            pix_fmt_out="yuv420p", quality=None, macro_block_size=1,
+            ffmpeg_log_level="error", output_params=["-preset", "veryfast"]
+        )
+        try:
+            frames.send(None)  # Start ffmpeg
+            while (frame := write_q.get()) is not None:
+                frames.send(np.ascontiguousarray(frame))
+        except Exception as e:
+            errors.append(e)
+            # Keep draining so the effect stage never blocks on a full queue
+            while write_q.get() is not None:
+                pass
+        finally:
+            frames.close()
+    
+    reader_thread = threading.Thread(target=reader, daemon=True)
+    writer_thread = threading.Thread(target=writer, daemon=True)
+    reader_thread.start()
+    writer_thread.start()
+    
+    try:
+        idx = 0
+        while (frame := read_q.get()) is not None:
+            write_q.put(callback(frame, idx))
+            idx += 1
+    finally:
+        write_q.put(None)
+        # Unblock the reader if the callback failed mid-clip
+        while reader_thread.is_alive():
+            try:
+                read_q.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        writer_thread.join()
+    
+    if errors:
+        raise errors[0]
+
+def _prepare_clip(job: dict) -> str:
+    """
+    Builds one beat's clip as a temp mp4: trim, 9:16 crop, scale and any
+    per-frame effects. Runs in a worker process, so it only takes plain data.
+    
+    Args:
+        job: Clip job built by execute_editing_plan
+    
+    Returns:
+        Path to the prepared clip or None if failed
+    """
+    i = job['index']
+    selected_path = job['path']
+    width, height, duration = job['probe']
+    beat_start = job['beat_start']
+    segment_duration = job['duration']
+    beat_mask = job['beat_mask']
+    tmp_dir = job['tmp_dir']
+    
+    try:
+        # Cut to duration (loop short clips at the demuxer level)
+        input_args = []
+        if duration > segment_duration + 0.1:
+            start_point = job['start_fraction'] * (duration - segment_duration)
+            input_args = ["-ss", f"{start_point:.3f}"]
+        elif duration < segment_duration:
+            input_args = ["-stream_loop", "-1"]
+        
+        # Crop to 9:16, scale to 720 wide and pad onto the shared canvas
+        filters = [
+            _crop_filter(width, height),
+            f"scale={OUTPUT_WIDTH}:{OUTPUT_HEIGHT}:force_original_aspect_ratio=decrease:force_divisible_by=2:flags=fast_bilinear",
+            f"pad={OUTPUT_WIDTH}:{OUTPUT_HEIGHT}:(ow-iw)/2:(oh-ih)/2",
+            "setsar=1"
+        ]
+        
+        # Crossfade between clips for smooth transitions
+        if i > 0:
+            filters.append("fade=t=in:st=0:d=0.2")
+        
+        clip_path = os.path.join(tmp_dir, f"clip_{i:04d}.mp4")
+        output_args = [
+            "-t", f"{segment_duration:.3f}",
+            "-vf", ",".join(filters),
+            "-r", str(OUTPUT_FPS)
+        ]
+        
+        # Apply effects from plan (except fades - those go on final video).
+        # Per-frame Python effects only touch this sub-clip.
+        effect_types = job['effects']
+        if "flash" not in effect_types and "zoom_pulse" not in effect_types:
+            _run_ffmpeg(*input_args, "-i", selected_path, *output_args, "-an", *X264_ARGS, clip_path)
+            return clip_path
+        
+        # Per-frame scale table: 1.0x -> 1.05x -> 1.0x over the clip
+        n_frames = max(1, int(np.ceil(segment_duration * OUTPUT_FPS)))
+        scales = 1.0 + 0.05 * np.abs(np.sin(np.arange(n_frames) / n_frames * np.pi * 2))
+        
+        # Effects write into a ring of preallocated frames instead of allocating
+        # per frame. The ring holds every frame that can be queued for the
+        # writer plus the ones being encoded and produced, so none is reused early.
+        ring = np.empty((FRAME_QUEUE_SIZE + 2, OUTPUT_HEIGHT, OUTPUT_WIDTH, 3), dtype=np.uint8)
+        scratch = np.empty((OUTPUT_HEIGHT, OUTPUT_WIDTH, 3), dtype=np.uint8)
+        
+        def apply_effects(frame, idx):
+            out = ring[idx % len(ring)]
+            for effect_type in effect_types:
+                if effect_type == "flash":
+                    # Frames past the end of the mask are past the audio: no beat there
+                    beat_idx = int((beat_start + idx / OUTPUT_FPS) * OUTPUT_FPS)
+                    if beat_idx < len(beat_mask) and beat_mask[beat_idx]:
+                        # Single uint8 pass, safe to run in place
+                        frame = cv2.LUT(frame, FLASH_LUT, dst=out)
+                
+                elif effect_type == "zoom_pulse":
+                    if frame is out:
+                        # Resampling can't run in place
+                        np.copyto(scratch, out)
+                        frame = scratch
+                    frame = _zoom_frame(frame, scales[min(idx, len(scales) - 1)], out=out)
+                
+                # Skip fade_in and fade_out - they're applied to final video
+            return frame
+        
+        # Stream the filtered frames straight from the decoding ffmpeg into
+        # the effect stage, so effect clips are encoded once, not twice
+        size = (OUTPUT_WIDTH, OUTPUT_HEIGHT)
+        frames = _read_frames(input_args, selected_path, output_args, size)
+        process_video_threaded(frames, size, apply_effects, clip_path)
+        
+        return clip_path
+    
+    except Exception as e:
+        print(f"Error processing {selected_path}: {e}")
+        return None
 
 def execute_editing_plan(plan: dict, audio_path: str, video_paths: list[str], output_path: str) -> str:
     """
@@ -21,37 +326,33 @@ def execute_editing_plan(plan: dict, audio_path: str, video_paths: list[str], ou
     """
     print("\n=== Executor Agent: Building Video ===")
     
+    tmp_dir = tempfile.mkdtemp(prefix="executor_")
+    
     try:
-        # Load audio with segment selection
-        audio_full = AudioFileClip(audio_path)
+        # Audio segment selection (cut and faded in the final ffmpeg pass)
         segment = plan['audio_segment']
-        audio = audio_full.subclipped(segment['start'], segment['end'])
+        audio_length = ffmpeg_parse_infos(audio_path)['duration']
+        audio_duration = min(segment['end'], audio_length) - segment['start']
         
         # Get fade duration from plan
         fade_duration = plan.get('fade_duration', 0.5)
         
-        # Apply AUDIO fades (smooth volume reduction)
-        audio = audio.with_effects([
-            afx.AudioFadeIn(fade_duration),
-            afx.AudioFadeOut(fade_duration)
-        ])
-        
         beat_times = plan['beat_times']
         beat_assignments = plan['beat_assignments']
         clip_classifications = plan['clip_classifications']
         
-        # Sort clips by intensity
-        sorted_clips_high = sorted(
-            clip_classifications.items(),
-            key=lambda x: x[1]['intensity'],
-            reverse=True
-        )
-        sorted_clips_low = sorted(
-            clip_classifications.items(),
-            key=lambda x: x[1]['intensity']
+        # Clip orderings per type, sorted by intensity only when a beat needs them
+        ordered_clips = {"rage": None, "calm": None, "mixed": list(clip_classifications.items())}
+        
+        # Precompute which output frames sit within 0.1s of a beat so the
+        # flash effect is a single lookup per frame instead of a beat scan
+        frame_times = np.arange(0, audio_duration, 1 / OUTPUT_FPS)
+        beat_mask = np.any(
+            np.abs(np.asarray(beat_times)[None, :] - frame_times[:, None]) < 0.1,
+            axis=1
         )
         
-        clips = []
+        jobs = []
         
         for assignment in beat_assignments:
             i = assignment['beat_idx']
@@ -60,106 +361,60 @@ def execute_editing_plan(plan: dict, audio_path: str, video_paths: list[str], ou
             
             beat_start = beat_times[i]
             beat_end = beat_times[i + 1]
-            segment_duration = beat_end - beat_start
             clip_type = assignment['clip_type']
             effects = assignment['effects']
             
             # Select clip based on type
-            if clip_type == "rage":
-                candidate_clips = sorted_clips_high
-            elif clip_type == "calm":
-                candidate_clips = sorted_clips_low
-            else:  # mixed
-                candidate_clips = list(clip_classifications.items())
-            
+            if clip_type not in ("rage", "calm"):
+                clip_type = "mixed"
+            if ordered_clips[clip_type] is None:
+                ordered_clips[clip_type] = sorted(
+                    ordered_clips["mixed"],
+                    key=lambda x: x[1]['intensity'],
+                    reverse=clip_type == "rage"
+                )
+            candidate_clips = ordered_clips[clip_type]
             selected_path = candidate_clips[i % len(candidate_clips)][0]
             
             try:
-                video = VideoFileClip(selected_path)
-                
-                # Crop to 9:16
-                target_ratio = 9/16
-                current_ratio = video.w / video.h
-                
-                if current_ratio > target_ratio:
-                    new_width = video.h * target_ratio * 1.1
-                    if new_width > video.w:
-                        new_width = video.w
-                    center_x = video.w / 2
-                    video = video.cropped(x1=center_x - new_width/2, width=new_width, height=video.h)
-                else:
-                    new_height = video.w / target_ratio * 0.9
-                    if new_height > video.h:
-                        new_height = video.h
-                    center_y = video.h / 2
-                    video = video.cropped(y1=center_y - new_height/2, width=video.w, height=new_height)
-                
-                video = video.resized(width=720)
-                
-                # Cut to duration
-                if video.duration > segment_duration + 0.1:
-                    max_start = video.duration - segment_duration
-                    if max_start > 0:
-                        start_point = random.uniform(0, max_start)
-                        segment = video.subclipped(start_point, start_point + segment_duration)
-                    else:
-                        segment = video.subclipped(0, min(segment_duration, video.duration))
-                else:
-                    if video.duration < segment_duration:
-                        num_loops = int(np.ceil(segment_duration / video.duration))
-                        looped = concatenate_videoclips([video] * num_loops)
-                        segment = looped.subclipped(0, segment_duration)
-                    else:
-                        segment = video.subclipped(0, segment_duration)
-                
-                # Apply effects from plan (except fades - those go on final video)
-                for effect in effects:
-                    effect_type = effect['type'] if isinstance(effect, dict) else effect
-                    
-                    if effect_type == "flash":
-                        def beat_flash_effect(get_frame, t):
-                            frame = get_frame(t)
-                            time_in_clip = t
-                            near_beat = False
-                            for beat in beat_times:
-                                if abs((beat_start + time_in_clip) - beat) < 0.1:
-                                    near_beat = True
-                                    break
-                            if near_beat:
-                                frame = np.clip(frame * 1.3, 0, 255).astype(np.uint8)
-                            return frame
-                        segment = segment.transform(beat_flash_effect)
-                    
-                    elif effect_type == "zoom_pulse":
-                        def zoom_pulse(t):
-                            progress = t / segment.duration if segment.duration > 0 else 0
-                            scale = 1.0 + 0.05 * abs(np.sin(progress * np.pi * 2))
-                            return scale
-                        segment = segment.resized(lambda t: zoom_pulse(t))
-                    
-                    # Skip fade_in and fade_out - they're applied to final video
-                
-                # Crossfade between clips for smooth transitions
-                if i > 0:
-                    segment = segment.with_effects([vfx.CrossFadeIn(0.2)])
-                
-                clips.append(segment)
-                
+                probe = _probe(selected_path)
             except Exception as e:
                 print(f"Error processing {selected_path}: {e}")
                 continue
+            
+            jobs.append({
+                'index': i,
+                'path': selected_path,
+                'probe': probe,
+                'beat_start': beat_start,
+                'duration': beat_end - beat_start,
+                # Drawn here so worker processes don't share one RNG state
+                'start_fraction': random.random(),
+                'effects': [effect['type'] if isinstance(effect, dict) else effect for effect in effects],
+                'beat_mask': beat_mask,
+                'tmp_dir': tmp_dir
+            })
         
-        if not clips:
+        # Clips are independent files, so prepare them in parallel
+        with ProcessPoolExecutor(max_workers=os.cpu_count()) as pool:
+            clip_files = [path for path in pool.map(_prepare_clip, jobs) if path]
+        
+        if not clip_files:
             print("No clips created.")
             return None
         
-        # Concatenate
+        # Concatenate with the ffmpeg concat demuxer (stream copy, no re-encode)
         print("Concatenating clips...")
-        final_video = concatenate_videoclips(clips, method="compose")
+        list_path = os.path.join(tmp_dir, "concat.txt")
+        with open(list_path, "w") as f:
+            for clip_path in clip_files:
+                f.write(f"file '{clip_path}'\n")
+        joined_path = os.path.join(tmp_dir, "joined.mp4")
+        _run_ffmpeg("-f", "concat", "-safe", "0", "-i", list_path, "-c", "copy", joined_path)
+        final_path = joined_path
         
         # CRITICAL FIX: Ensure video duration EXACTLY matches audio duration
-        audio_duration = audio.duration
-        video_duration = final_video.duration
+        video_duration = _parse_probe(joined_path)[2]
         
         print(f"Video duration: {video_duration:.2f}s, Audio duration: {audio_duration:.2f}s")
         
@@ -170,40 +425,56 @@ def execute_editing_plan(plan: dict, audio_path: str, video_paths: list[str], ou
                 # Video is shorter - loop it to fill audio duration
                 print(f"Looping video to match audio duration...")
                 num_loops = int(np.ceil(audio_duration / video_duration))
-                looped_video = concatenate_videoclips([final_video] * num_loops, method="compose")
-                final_video = looped_video.subclipped(0, audio_duration)
+                looped_path = os.path.join(tmp_dir, "looped.mp4")
+                final_path = _loop_ffmpeg(joined_path, num_loops, audio_duration, looped_path)
             else:
-                # Video is longer - trim it
+                # Video is longer - trimmed to the audio by -t in the render below
                 print(f"Trimming video to match audio duration...")
-                final_video = final_video.subclipped(0, audio_duration)
         
-        # Apply fade effects to FINAL video (not individual clips) to avoid freezing
+        # Apply fade effects to FINAL video (not individual clips) to avoid freezing.
+        # Video and audio fades run as ffmpeg filters in the same pass as the encode.
         print(f"Applying fade effects ({fade_duration}s)...")
-        final_video = final_video.with_effects([
-            vfx.FadeIn(fade_duration),
-            vfx.FadeOut(fade_duration)
-        ])
+        fade_out_start = max(0.0, audio_duration - fade_duration)
+        video_filters = [
+            f"fade=t=in:st=0:d={fade_duration}",
+            f"fade=t=out:st={fade_out_start:.3f}:d={fade_duration}"
+        ]
+        audio_filters = [
+            f"afade=t=in:st=0:d={fade_duration}",
+            f"afade=t=out:st={fade_out_start:.3f}:d={fade_duration}"
+        ]
         
-        # Set audio
-        final_video = final_video.with_audio(audio)
+        codec, codec_params = _final_encoder()
+        codec_params = list(codec_params)
+        if "-vf" in codec_params:
+            # Encoder-specific upload filters have to run after the fades
+            k = codec_params.index("-vf")
+            video_filters.append(codec_params[k + 1])
+            del codec_params[k:k + 2]
         
-        print(f"✅ Final video duration: {final_video.duration:.2f}s (matches audio)")
+        print(f"✅ Final video duration: {audio_duration:.2f}s (matches audio)")
         
         # Render
-        print("Rendering final video...")
-        final_video.write_videofile(output_path, codec="libx264", audio_codec="aac", fps=24)
-        
-        # Cleanup
-        for clip in clips:
-            clip.close()
-        audio.close()
-        final_video.close()
+        print(f"Rendering final video ({codec})...")
+        _run_ffmpeg(
+            "-i", final_path,
+            "-ss", f"{segment['start']:.3f}", "-t", f"{audio_duration:.3f}", "-i", audio_path,
+            "-map", "0:v:0", "-map", "1:a:0",
+            "-t", f"{audio_duration:.3f}",
+            "-vf", ",".join(video_filters),
+            "-af", ",".join(audio_filters),
+            "-r", str(OUTPUT_FPS), "-c:v", codec, *codec_params,
+            "-c:a", "aac",
+            output_path
+        )
         
         print(f"✅ Video created: {output_path}")
         return output_path
-        
+    
     except Exception as e:
         print(f"Error in executor: {e}")
         import traceback
         traceback.print_exc()
         return None
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
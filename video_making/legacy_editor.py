@@ -1,19 +1,49 @@
-from moviepy import VideoFileClip, AudioFileClip, concatenate_videoclips, vfx
+from moviepy import VideoClip, VideoFileClip, AudioFileClip, concatenate_videoclips, vfx
+import cv2
 import numpy as np
 import os
 import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from video_making.audio_cache import load_audio_once
 from video_making.beat_detector import detect_beats, get_audio_intensity_segments
 from video_making.clip_classifier import classify_multiple_clips
+from video_making.executor import FLASH_LUT
 from video_making.segment_selector import find_best_segment
 
+FPS = 24
+
+def _match_segment_intensities(beat_times: list, beat_times_full: list, intensities_full: list, offset: float) -> list:
+    """
+    Looks up the full-track intensity for each segment beat, matching beats
+    within 100ms by binary search over the sorted full-track beats.
+    Unmatched beats are skipped.
+    """
+    full = np.asarray(beat_times_full[:-1], dtype=np.float64)
+    want = np.asarray(beat_times[:-1], dtype=np.float64) + offset
+    if len(full) == 0 or len(want) == 0:
+        return []
+    
+    # Nearest full-track beat on either side of each wanted time
+    idx = np.searchsorted(full, want)
+    left = np.clip(idx - 1, 0, len(full) - 1)
+    right = np.clip(idx, 0, len(full) - 1)
+    nearest = np.where(np.abs(full[left] - want) <= np.abs(full[right] - want), left, right)
+    
+    matched = (np.abs(full[nearest] - want) < 0.1) & (nearest < len(intensities_full))
+    return [intensities_full[j] for j in nearest[matched]]
+
 def create_anime_edit(audio_path: str, video_paths: list[str], output_path: str):
     """
     Creates a beat-synced anime edit with emotion-aware clip selection and intelligent audio selection.
     """
     try:
+        # Decode the song once; every analysis step below reuses these samples
+        audio_samples = load_audio_once(audio_path)
+        
         # STEP 0: Find the best audio segment (calm intro + rage drop)
         print("Analyzing audio for best segment...")
-        segment_info = find_best_segment(audio_path, target_duration=12.0)
+        segment_info = find_best_segment(audio_path, target_duration=12.0, audio=audio_samples)
         print(f"Selected segment: {segment_info['start_time']:.1f}s - {segment_info['end_time']:.1f}s")
         print(f"Rage drop at: {segment_info['calm_end']:.1f}s")
         
@@ -32,7 +62,7 @@ def create_anime_edit(audio_path: str, video_paths: list[str], output_path: str)
         
         # STEP 1: Detect beats
         print("Detecting beats...")
-        beat_data = detect_beats(audio_path)
+        beat_data = detect_beats(audio_path, audio=audio_samples)
         beat_times_full = beat_data['beat_times']
         
         # Adjust beat times to selected segment
@@ -48,18 +78,10 @@ def create_anime_edit(audio_path: str, video_paths: list[str], output_path: str)
         # STEP 2: Get audio intensity for each beat segment
         print("Analyzing audio intensity...")
         # Detect on full audio then filter
-        intensities_full = get_audio_intensity_segments(audio_path, beat_times_full)
+        intensities_full = get_audio_intensity_segments(audio_path, beat_times_full, audio=audio_samples)
         
         # Map to segment beats
-        intensities = []
-        for i in range(len(beat_times) - 1):
-            beat_start_abs = beat_times[i] + segment_info['start_time']
-            # Find corresponding intensity in full audio
-            for j, bt in enumerate(beat_times_full[:-1]):
-                if abs(bt - beat_start_abs) < 0.1:  # Match within 100ms
-                    if j < len(intensities_full):
-                        intensities.append(intensities_full[j])
-                    break
+        intensities = _match_segment_intensities(beat_times, beat_times_full, intensities_full, segment_info['start_time'])
         
         if not intensities or len(intensities) < len(beat_times) - 1:
             intensities = [0.5] * (len(beat_times) - 1)
@@ -82,18 +104,16 @@ def create_anime_edit(audio_path: str, video_paths: list[str], output_path: str)
             key=lambda x: x[1]['intensity']
         )
         
-        clips = []
+        # Sorted beat array for the per-clip flash masks
+        beat_times_np = np.asarray(beat_times, dtype=np.float64)
         
         # Calculate calm end relative to segment
         calm_end_relative = segment_info['calm_end'] - segment_info['start_time']
         
-        for i in range(len(beat_times) - 1):
-            if i >= len(intensities):
-                break
-            
+        # Decide every beat's source clip up front: (beat index, path, start, end)
+        plan = []
+        for i in range(min(len(beat_times) - 1, len(intensities))):
             beat_start = beat_times[i]
-            beat_end = beat_times[i + 1]
-            segment_duration = beat_end - beat_start
             
             # PROGRESSIVE INTENSITY: Use segment's calm_end timestamp
             audio_intensity = intensities[i]
@@ -115,10 +135,24 @@ def create_anime_edit(audio_path: str, video_paths: list[str], output_path: str)
                 candidate_clips = sorted_clips_low
             
             # Cycle through clips evenly
-            selected_path = candidate_clips[i % len(candidate_clips)][0]
+            plan.append((i, candidate_clips[i % len(candidate_clips)][0], beat_start, beat_times[i + 1]))
+        
+        def open_source(path):
+            try:
+                return VideoFileClip(path)
+            except Exception as e:
+                print(f"Error processing {path}: {e}")
+                return None
+        
+        def make_segment(item):
+            """Builds the cropped, trimmed and effected clip for one planned beat."""
+            i, selected_path, beat_start, beat_end = item
+            segment_duration = beat_end - beat_start
             
             try:
-                video = VideoFileClip(selected_path)
+                video = source_clips.get(selected_path)
+                if video is None:
+                    return None
                 
                 # IMPROVED CROPPING: Less aggressive, better visibility
                 target_ratio = 9/16
@@ -155,47 +189,55 @@ def create_anime_edit(audio_path: str, video_paths: list[str], output_path: str)
                 else:
                     # Video is shorter than segment, loop or extend
                     if video.duration < segment_duration:
-                        # Loop the clip to fill duration
-                        num_loops = int(np.ceil(segment_duration / video.duration))
-                        looped = concatenate_videoclips([video] * num_loops)
-                        segment = looped.subclipped(0, segment_duration)
+                        # Loop the clip to fill duration by wrapping time
+                        # into the one source, instead of concatenating copies
+                        segment = VideoClip(
+                            lambda t, video=video: video.get_frame(t % video.duration),
+                            duration=segment_duration
+                        )
+                        segment.fps = video.fps
                     else:
                         segment = video.subclipped(0, segment_duration)
                 
                 # BEAT-SYNCED FLASH EFFECTS
-                # Quick zoom pulse and brightness flash on beat
-                def beat_flash_effect(get_frame, t):
+                # Quick zoom pulse and brightness flash on beat.
+                # Precompute which output frames of this clip are near a beat
+                # (within 0.1s), so the effect is a lookup instead of a search
+                frame_times = beat_start + np.arange(int(np.ceil(segment.duration * FPS)) + 1) / FPS
+                idx = np.clip(np.searchsorted(beat_times_np, frame_times), 1, len(beat_times_np) - 1)
+                nearest = np.minimum(
+                    np.abs(beat_times_np[idx] - frame_times),
+                    np.abs(beat_times_np[idx - 1] - frame_times)
+                )
+                flash_mask = nearest < 0.1
+                
+                # Per-clip values are bound as default args since frames are
+                # only rendered once every clip has been built
+                def beat_flash_effect(get_frame, t, flash_mask=flash_mask, clip_duration=segment.duration):
                     """
-                    Apply quick zoom pulse and brightness flash at beat hits.
+                    Apply quick zoom pulse and brightness flash at beat hits,
+                    fused into one pass over each frame.
                     """
                     frame = get_frame(t)
                     
-                    # Check if we're near a beat (within 0.1s)
-                    time_in_clip = t
-                    near_beat = False
-                    for beat in beat_times:
-                        if abs((beat_start + time_in_clip) - beat) < 0.1:
-                            near_beat = True
-                            break
+                    # Quick zoom pulse: 1.0x -> 1.05x -> 1.0x during clip.
+                    # Sine wave for pulse effect; only the visible center is resampled.
+                    progress = t / clip_duration if clip_duration > 0 else 0
+                    scale = 1.0 + 0.05 * abs(np.sin(progress * np.pi * 2))
+                    h, w = frame.shape[:2]
+                    crop_h, crop_w = int(round(h / scale)), int(round(w / scale))
+                    y0, x0 = (h - crop_h) // 2, (w - crop_w) // 2
+                    frame = cv2.resize(frame[y0:y0 + crop_h, x0:x0 + crop_w], (w, h), interpolation=cv2.INTER_LINEAR)
                     
-                    if near_beat:
+                    if flash_mask[min(int(round(t * FPS)), len(flash_mask) - 1)]:
                         # Quick brightness flash (increase brightness by 30%)
-                        frame = np.clip(frame * 1.3, 0, 255).astype(np.uint8)
+                        frame = cv2.LUT(frame, FLASH_LUT)
                     
                     return frame
                 
-                # Apply flash effect
+                # Apply flash + zoom in a single transform
                 segment = segment.transform(beat_flash_effect)
                 
-                # Quick zoom pulse: 1.0x -> 1.05x -> 1.0x during clip
-                def zoom_pulse(t):
-                    progress = t / segment.duration if segment.duration > 0 else 0
-                    # Sine wave for pulse effect
-                    scale = 1.0 + 0.05 * abs(np.sin(progress * np.pi * 2))
-                    return scale
-                
-                segment = segment.resized(lambda t: zoom_pulse(t))
-                
                 # Add crossfade transition
                 if i == 0:
                     # First clip: fade in BOTH video and brightness
@@ -208,43 +250,68 @@ def create_anime_edit(audio_path: str, video_paths: list[str], output_path: str)
                 if i == len(beat_times) - 2:
                     segment = segment.with_effects([vfx.FadeOut(0.3)])
                 
-                clips.append(segment)
-                
+                return segment
+            
             except Exception as e:
                 print(f"Error processing {selected_path}: {e}")
                 import traceback
                 traceback.print_exc()
-                continue
-        
-        if not clips:
-            print("No clips created.")
-            return None
-        
-        # Concatenate clips
-        print("Concatenating clips...")
-        final_video = concatenate_videoclips(clips, method="compose")
-        
-        # Ensure final video matches audio duration exactly
-        if final_video.duration > audio_duration:
-            final_video = final_video.subclipped(0, audio_duration)
-        elif final_video.duration < audio_duration:
-            # Extend if needed (shouldn't happen, but safety check)
-            print(f"Warning: video shorter than audio ({final_video.duration} vs {audio_duration})")
-        
-        # Set audio
-        final_video = final_video.with_audio(audio)
-        
-        # Write output
-        print("Rendering final video...")
-        final_video.write_videofile(output_path, codec="libx264", audio_codec="aac", fps=24)
+                return None
         
-        # Close all clips to free memory
-        for clip in clips:
-            clip.close()
-        audio.close()
-        final_video.close()
+        def build_segment(item):
+            # transform() renders a frame to size the new clip, and each source
+            # has a single ffmpeg reader, so beats sharing a source take turns
+            with source_locks[item[1]]:
+                return make_segment(item)
         
-        return output_path
+        # Sources are picked cyclically, so open each file once and take
+        # every beat's subclip from the shared reader. Opening (probing) the
+        # files and building the lazy per-beat clips overlap across threads;
+        # map() keeps the clips in beat order.
+        source_clips = {}
+        clips = []
+        try:
+            with ThreadPoolExecutor(max_workers=4) as pool:
+                paths = list(dict.fromkeys(item[1] for item in plan))
+                # Unreadable sources are left out, so their beats are skipped
+                for path, clip in zip(paths, pool.map(open_source, paths)):
+                    if clip is not None:
+                        source_clips[path] = clip
+                source_locks = {path: threading.Lock() for path in paths}
+                clips.extend(c for c in pool.map(build_segment, plan) if c is not None)
+            
+            if not clips:
+                print("No clips created.")
+                return None
+            
+            # Concatenate clips
+            print("Concatenating clips...")
+            final_video = concatenate_videoclips(clips, method="compose")
+            
+            # Ensure final video matches audio duration exactly
+            if final_video.duration > audio_duration:
+                final_video = final_video.subclipped(0, audio_duration)
+            elif final_video.duration < audio_duration:
+                # Extend if needed (shouldn't happen, but safety check)
+                print(f"Warning: video shorter than audio ({final_video.duration} vs {audio_duration})")
+            
+            # Set audio
+            final_video = final_video.with_audio(audio)
+            
+            # Write output
+            print("Rendering final video...")
+            final_video.write_videofile(output_path, codec="libx264", audio_codec="aac", fps=FPS)
+            
+            final_video.close()
+            
+            return output_path
+        finally:
+            # Close all clips to free memory, also when rendering failed
+            for clip in clips:
+                clip.close()
+            for clip in source_clips.values():
+                clip.close()
+            audio.close()
 
     except Exception as e:
         print(f"Error creating edit: {e}")
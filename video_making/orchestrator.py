@@ -4,10 +4,13 @@ Analyzes TikTok metadata, audio, and clips to create an intelligent editing plan
 """
 from google import genai
 from google.genai.types import Tool, FunctionDeclaration, Schema, Type
+import bisect
 import json
+import numpy as np
 import os
 from video_making.beat_detector import detect_beats, get_audio_intensity_segments
 from video_making.clip_classifier import classify_multiple_clips
+from video_making.disk_cache import disk_cache
 from video_making.segment_selector import find_best_segment
 
 # Initialize Gemini client with API key from environment
@@ -26,6 +29,12 @@ except Exception as e:
     USE_LLM = False
     print(f"⚠️  Could not initialize Gemini client: {e}. Using fallback.")
 
+# Shared generator for the temperature-based creative choices
+_RNG = np.random.default_rng()
+
+# How long LLM-generated search queries are reused for the same metadata
+QUERY_CACHE_MAX_AGE = 7 * 24 * 3600
+
 def generate_search_queries(tiktok_metadata: dict) -> list[str]:
     """
     Uses LLM to generate intelligent search queries from TikTok metadata.
@@ -56,11 +65,25 @@ def generate_search_queries(tiktok_metadata: dict) -> list[str]:
         return queries[:5]
     
     # Use LLM
+    try:
+        return _llm_search_queries(tiktok_metadata.get('caption', ''), tiktok_metadata.get('sound_title', ''))
+    except Exception as e:
+        print(f"Error generating queries with LLM: {e}")
+        # Fallback
+        caption = tiktok_metadata.get('caption', '').lower()
+        return [f"anime fight scene 4k", f"{caption} anime"]
+
+@disk_cache(key=lambda caption, sound_title: (caption, sound_title), max_age=QUERY_CACHE_MAX_AGE)
+def _llm_search_queries(caption: str, sound_title: str) -> list[str]:
+    """
+    Asks Gemini for search queries. Results are cached on disk per
+    (caption, sound_title); failures raise, so they are never cached.
+    """
     prompt = f"""Based on this TikTok metadata, generate 3-5 diverse search queries to find anime clips on YouTube:
 
-Caption: {tiktok_metadata.get('caption', '')}
-Sound: {tiktok_metadata.get('sound_title', '')}
-Hashtags: {tiktok_metadata.get('caption', '')}
+Caption: {caption}
+Sound: {sound_title}
+Hashtags: {caption}
 
 The queries should:
 1. Extract anime names/characters mentioned
@@ -71,28 +94,22 @@ The queries should:
 Return ONLY a JSON array of query strings, no markdown or explanation:
 ["query1", "query2", "query3"]"""
 
-    try:
-        response = client.models.generate_content(
-            model='gemini-2.0-flash-exp',
-            contents=prompt
-        )
-        
-        # Extract JSON from response
-        text = response.text.strip()
-        # Remove markdown code blocks if present
-        if text.startswith('```'):
-            text = text.split('\n', 1)[1]
-            text = text.rsplit('\n', 1)[0]
-        if text.startswith('json'):
-            text = text[4:].strip()
-        
-        queries = json.loads(text)
-        return queries if isinstance(queries, list) else [queries]
-    except Exception as e:
-        print(f"Error generating queries with LLM: {e}")
-        # Fallback
-        caption = tiktok_metadata.get('caption', '').lower()
-        return [f"anime fight scene 4k", f"{caption} anime"]
+    response = client.models.generate_content(
+        model='gemini-2.0-flash-exp',
+        contents=prompt
+    )
+    
+    # Extract JSON from response
+    text = response.text.strip()
+    # Remove markdown code blocks if present
+    if text.startswith('```'):
+        text = text.split('\n', 1)[1]
+        text = text.rsplit('\n', 1)[0]
+    if text.startswith('json'):
+        text = text[4:].strip()
+    
+    queries = json.loads(text)
+    return queries if isinstance(queries, list) else [queries]
 
 
 def select_editing_pattern(audio_path: str, temperature: float = 0.5) -> str:
@@ -106,8 +123,6 @@ def select_editing_pattern(audio_path: str, temperature: float = 0.5) -> str:
     Returns:
         Pattern string: 'calm-rage', 'rage-calm', 'calm-rage-calm', etc.
     """
-    import random
-    
     # Available patterns
     patterns = [
         'calm-rage',           # Traditional buildup
@@ -123,15 +138,15 @@ def select_editing_pattern(audio_path: str, temperature: float = 0.5) -> str:
     # Low temperature = prefer traditional patterns
     if temperature > 0.7:
         # High creativity - any pattern
-        return random.choice(patterns)
+        return patterns[_RNG.integers(len(patterns))]
     elif temperature > 0.4:
         # Medium creativity - prefer varied patterns
         weights = [0.2, 0.15, 0.25, 0.15, 0.1, 0.05, 0.1]
-        return random.choices(patterns, weights=weights)[0]
+        return patterns[_RNG.choice(len(patterns), p=weights)]
     else:
         # Low creativity - prefer traditional
         weights = [0.5, 0.2, 0.15, 0.1, 0.03, 0.01, 0.01]
-        return random.choices(patterns, weights=weights)[0]
+        return patterns[_RNG.choice(len(patterns), p=weights)]
 
 def select_editing_intensity(temperature: float = 0.5) -> str:
     """
@@ -140,17 +155,16 @@ def select_editing_intensity(temperature: float = 0.5) -> str:
     Returns:
         'low', 'medium', or 'high'
     """
-    import random
-    
     if temperature > 0.7:
         # High temp favors varied/high intensity
-        return random.choice(['medium', 'high', 'high'])
+        options = ['medium', 'high', 'high']
     elif temperature > 0.3:
         # Medium temp balanced
-        return random.choice(['low', 'medium', 'medium', 'high'])
+        options = ['low', 'medium', 'medium', 'high']
     else:
         # Low temp conservative
-        return random.choice(['low', 'low', 'medium'])
+        options = ['low', 'low', 'medium']
+    return options[_RNG.integers(len(options))]
 
 def select_duration(clip_count: int, temperature: float = 0.5) -> float:
     """
@@ -163,8 +177,6 @@ def select_duration(clip_count: int, temperature: float = 0.5) -> float:
     Returns:
         Duration in seconds (6-20s range)
     """
-    import random
-    
     # Base duration from clip count
     if clip_count >= 10:
         base_min, base_max = 14, 20
@@ -178,10 +190,10 @@ def select_duration(clip_count: int, temperature: float = 0.5) -> float:
     # Temperature affects variance
     if temperature > 0.6:
         # High temp = wider range
-        duration = random.uniform(base_min - 2, base_max + 2)
+        duration = _RNG.uniform(base_min - 2, base_max + 2)
     elif temperature > 0.3:
         # Medium temp = moderate range
-        duration = random.uniform(base_min, base_max)
+        duration = _RNG.uniform(base_min, base_max)
     else:
         # Low temp = narrow, predictable
         duration = (base_min + base_max) / 2
@@ -189,7 +201,7 @@ def select_duration(clip_count: int, temperature: float = 0.5) -> float:
     # Clamp to 6-20s
     return max(6.0, min(20.0, duration))
 
-def create_editing_plan(audio_path: str, tiktok_metadata: dict, clip_paths: list[str], temperature: float = 0.5) -> dict:
+def create_editing_plan(audio_path: str, tiktok_metadata: dict, clip_paths: list[str], temperature: float = 0.5, beat_data: dict = None) -> dict:
     """
     Orchestrator agent that creates a comprehensive editing plan with creative temperature.
     
@@ -198,6 +210,7 @@ def create_editing_plan(audio_path: str, tiktok_metadata: dict, clip_paths: list
         tiktok_metadata: TikTok video metadata
         clip_paths: List of available video clips
         temperature: Creativity level (0.0-1.0)
+        beat_data: Precomputed detect_beats() result for audio_path (optional)
     
     Returns:
         Editing plan dict
@@ -231,26 +244,23 @@ def create_editing_plan(audio_path: str, tiktok_metadata: dict, clip_paths: list
     
     # Step 4: Analyze audio with pattern
     print("Analyzing audio structure...")
-    from video_making.segment_selector import find_best_segment
-    
     segment_info = find_best_segment(audio_path, target_duration=target_duration, pattern=pattern)
-    beat_data = detect_beats(audio_path)
+    if beat_data is None:
+        beat_data = detect_beats(audio_path)
     
     # Adjust beats to segment
     beat_times_full = beat_data['beat_times']
     beat_times = [b - segment_info['start_time'] for b in beat_times_full 
                  if segment_info['start_time'] <= b <= segment_info['end_time']]
     
-    # Get intensities
-    intensities_full = get_audio_intensity_segments(audio_path, beat_times_full)
-    intensities = []
-    for i in range(len(beat_times) - 1):
-        beat_start_abs = beat_times[i] + segment_info['start_time']
-        for j, bt in enumerate(beat_times_full[:-1]):
-            if abs(bt - beat_start_abs) < 0.1:
-                if j < len(intensities_full):
-                    intensities.append(intensities_full[j])
-                break
+    # Get intensities (computed by detect_beats; older cached results lack them)
+    intensities_full = beat_data.get('intensities')
+    if intensities_full is None:
+        intensities_full = get_audio_intensity_segments(audio_path, beat_times_full)
+    # Beats are sorted, so the segment's beats are one contiguous run of the
+    # full list and their intensities the matching slice
+    first_beat = bisect.bisect_left(beat_times_full, segment_info['start_time'])
+    intensities = list(intensities_full[first_beat:first_beat + max(0, len(beat_times) - 1)])
     
     # Step 5: Create beat assignments
     print("Creating beat-to-clip assignments...")
@@ -3,16 +3,31 @@ Intelligent audio segment selector for finding the best part of a song.
 Analyzes audio to find calm intro and rage drop sections.
 """
 import numpy as np
-from moviepy import AudioFileClip
+from video_making.audio_cache import load_audio_once
+from video_making.disk_cache import disk_cache, file_fingerprint
 
-def find_best_segment(audio_path: str, target_duration: float = 12.0, pattern: str = "calm-rage") -> dict:
+# 1-second loudness windows don't need anywhere near CD-quality audio
+ANALYSIS_SR = 4000
+
+def _first_best(scores: np.ndarray) -> int:
+    """
+    Index of the highest score, earliest on ties. Prefix-sum means pick up
+    rounding noise, so scores are rounded first; otherwise equal windows
+    could rank differently than when each mean is computed directly.
+    """
+    return int(np.argmax(np.round(scores, 9)))
+
+def find_best_segment(audio_path: str, target_duration: float = 12.0, pattern: str = "calm-rage", audio: tuple = None) -> dict:
     """
     Finds the best segment of an audio track matching the desired pattern.
+    Results are cached on disk per audio file and arguments; if analysis
+    fails, the start of the track is returned (and never cached).
     
     Args:
         audio_path: Path to audio file
         target_duration: Desired segment duration in seconds
         pattern: Desired intensity pattern (e.g., 'calm-rage', 'rage-calm', 'calm-rage-calm')
+        audio: Already decoded (mono samples, sample rate) for audio_path (optional)
     
     Returns:
         dict: {
@@ -23,135 +38,114 @@ def find_best_segment(audio_path: str, target_duration: float = 12.0, pattern: s
         }
     """
     try:
-        audio_clip = AudioFileClip(audio_path)
-        total_duration = audio_clip.duration
-        
-        # If audio is shorter than target, use entire audio
-        if total_duration <= target_duration:
-            audio_clip.close()
-            return {
-                'start_time': 0,
-                'end_time': total_duration,
-                'duration': total_duration,
-                'calm_end': total_duration * 0.6  # 60% mark
-            }
-        
-        # Get audio array
-        fps = audio_clip.fps
-        audio_array = audio_clip.to_soundarray(fps=fps)
-        
-        # Convert to mono if stereo
-        if len(audio_array.shape) > 1 and audio_array.shape[1] > 1:
-            audio_array = np.mean(audio_array, axis=1)
-        
-        # Analyze energy in 1-second windows
-        window_size = fps  # 1 second
-        num_windows = len(audio_array) // window_size
-        
-        energies = []
-        for i in range(num_windows):
-            start_idx = i * window_size
-            end_idx = start_idx + window_size
-            window = audio_array[start_idx:end_idx]
-            energy = np.sqrt(np.mean(window**2))
-            energies.append(energy)
+        return _find_best_segment(audio_path, target_duration, pattern, audio)
+    except Exception as e:
+        print(f"Error finding best segment: {e}")
+        import traceback
+        traceback.print_exc()
+        # Fallback: use start of audio
+        return {
+            'start_time': 0,
+            'end_time': min(target_duration, 30),
+            'duration': min(target_duration, 30),
+            'calm_end': target_duration * 0.6
+        }
+
+@disk_cache(key=lambda audio_path, target_duration, pattern, audio: (
+    file_fingerprint(audio_path), target_duration, pattern, audio[1] if audio is not None else ANALYSIS_SR
+))
+def _find_best_segment(audio_path: str, target_duration: float, pattern: str, audio: tuple) -> dict:
+    """find_best_segment() without the fallback, so failures raise instead of being cached."""
+    # Get mono audio array (decoded at the analysis rate unless shared)
+    audio_array, fps = audio if audio is not None else load_audio_once(audio_path, ANALYSIS_SR)
+    # Loudness needs no float64 precision; keep shared buffers float32 too
+    audio_array = np.asarray(audio_array, dtype=np.float32)
+    total_duration = len(audio_array) / fps
+    
+    # If audio is shorter than target, use entire audio
+    if total_duration <= target_duration:
+        return {
+            'start_time': 0,
+            'end_time': total_duration,
+            'duration': total_duration,
+            'calm_end': total_duration * 0.6  # 60% mark
+        }
+    
+    # Analyze energy in 1-second windows (one row per window)
+    window_size = fps  # 1 second
+    num_windows = len(audio_array) // window_size
+    frames = audio_array[:num_windows * window_size].reshape(num_windows, window_size)
+    # Row-wise sum of squares in one fused pass (no squared-frames temporary)
+    energies = np.sqrt(np.einsum('ij,ij->i', frames, frames) / np.float32(window_size))
+    
+    # Pattern-based segment selection
+    target_windows = int(target_duration)
+    num_starts = len(energies) - target_windows
+    best_start = 0
+    calm_end_time = target_duration * 0.6  # Default
+    
+    if num_starts > 0:
+        # Prefix sums turn every slice mean into one subtraction, so each
+        # pattern scores all candidate starts at once in O(N)
+        csum = np.concatenate(([0.0], np.cumsum(energies, dtype=np.float64)))
+        starts = np.arange(num_starts)
         
-        energies = np.array(energies)
+        def mean_range(a: int, b: int) -> np.ndarray:
+            """Mean of energies[k + a:k + b] for every candidate start k."""
+            return (csum[starts + b] - csum[starts + a]) / (b - a)
         
-        # Pattern-based segment selection
-        target_windows = int(target_duration)
-        best_score = -1
-        best_start = 0
-        calm_end_time = target_duration * 0.6  # Default
+        # Window offsets shared by the patterns, computed once
+        w30, w40, w50, w60, w70 = (int(target_windows * f) for f in (0.3, 0.4, 0.5, 0.6, 0.7))
         
-        # Define pattern scoring functions
         if pattern == "calm-rage":
             # Low energy start, high energy end
-            for start_window in range(len(energies) - target_windows):
-                segment = energies[start_window:start_window + target_windows]
-                intro = np.mean(segment[:int(target_windows * 0.4)])
-                drop = np.mean(segment[int(target_windows * 0.5):])
-                score = drop - intro
-                if score > best_score:
-                    best_score, best_start = score, start_window
-                    calm_end_time = start_window + np.argmax(segment)
+            intro = mean_range(0, w40)
+            drop = mean_range(w50, target_windows)
+            best_start = _first_best(drop - intro)
+            calm_end_time = best_start + np.argmax(energies[best_start:best_start + target_windows])
         
         elif pattern == "rage-calm":
             # High energy start, low energy end
-            for start_window in range(len(energies) - target_windows):
-                segment = energies[start_window:start_window + target_windows]
-                intro = np.mean(segment[:int(target_windows * 0.4)])
-                outro = np.mean(segment[int(target_windows * 0.6):])
-                score = intro - outro
-                if score > best_score:
-                    best_score, best_start = score, start_window
-                    calm_end_time = start_window + int(target_windows * 0.7)
+            intro = mean_range(0, w40)
+            outro = mean_range(w60, target_windows)
+            best_start = _first_best(intro - outro)
+            calm_end_time = best_start + w70
         
         elif pattern == "calm-rage-calm":
             # Low-high-low arc
-            for start_window in range(len(energies) - target_windows):
-                segment = energies[start_window:start_window + target_windows]
-                intro = np.mean(segment[:int(target_windows * 0.3)])
-                mid = np.mean(segment[int(target_windows * 0.4):int(target_windows * 0.6)])
-                outro = np.mean(segment[int(target_windows * 0.7):])
-                score = mid - (intro + outro) / 2
-                if score > best_score:
-                    best_score, best_start = score, start_window
-                    calm_end_time = start_window + int(target_windows * 0.4)
+            intro = mean_range(0, w30)
+            mid = mean_range(w40, w60)
+            outro = mean_range(w70, target_windows)
+            best_start = _first_best(mid - (intro + outro) / 2)
+            calm_end_time = best_start + w40
         
         elif "rage" in pattern and pattern.count("rage") >= 2:
             # High energy throughout
-            for start_window in range(len(energies) - target_windows):
-                segment = energies[start_window:start_window + target_windows]
-                score = np.mean(segment)
-                if score > best_score:
-                    best_score, best_start = score, start_window
-                    calm_end_time = None  # No calm section
+            best_start = _first_best(mean_range(0, target_windows))
+            calm_end_time = None  # No calm section
         
         elif "calm" in pattern and pattern.count("calm") >= 2:
             # Low energy throughout
-            for start_window in range(len(energies) - target_windows):
-                segment = energies[start_window:start_window + target_windows]
-                score = -np.mean(segment)  # Prefer low energy
-                if score > best_score:
-                    best_score, best_start = score, start_window
-                    calm_end_time = None  # All calm
+            best_start = _first_best(-mean_range(0, target_windows))  # Prefer low energy
+            calm_end_time = None  # All calm
         
         else:
             # Default to calm-rage for unknown patterns
-            for start_window in range(len(energies) - target_windows):
-                segment = energies[start_window:start_window + target_windows]
-                intro = np.mean(segment[:int(target_windows * 0.4)])
-                drop = np.mean(segment[int(target_windows * 0.5):])
-                score = drop - intro
-                if score > best_score:
-                    best_score, best_start = score, start_window
-                    calm_end_time = start_window + np.argmax(segment)
-        
-        # Calculate final segment times
-        start_time = best_start
-        end_time = start_time + target_duration
-        
-        audio_clip.close()
-        
-        return {
-            'start_time': float(start_time),
-            'end_time': float(end_time),
-            'duration': target_duration,
-            'calm_end': float(calm_end_time) if calm_end_time is not None else None
-        }
-        
-    except Exception as e:
-        print(f"Error finding best segment: {e}")
-        import traceback
-        traceback.print_exc()
-        # Fallback: use start of audio
-        return {
-            'start_time': 0,
-            'end_time': min(target_duration, 30),
-            'duration': min(target_duration, 30),
-            'calm_end': target_duration * 0.6
-        }
+            intro = mean_range(0, w40)
+            drop = mean_range(w50, target_windows)
+            best_start = _first_best(drop - intro)
+            calm_end_time = best_start + np.argmax(energies[best_start:best_start + target_windows])
+    
+    # Calculate final segment times
+    start_time = best_start
+    end_time = start_time + target_duration
+    
+    return {
+        'start_time': float(start_time),
+        'end_time': float(end_time),
+        'duration': target_duration,
+        'calm_end': float(calm_end_time) if calm_end_time is not None else None
+    }
 
 if __name__ == "__main__":
     import sys